@@ -0,0 +1,306 @@
+# Import required libraries
+import argparse
+import importlib
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+"""Benchmarks of the dashboard hot paths
+
+Generates (or reuses) a synthetic bookings file of the requested size and times every
+stage of serving the report separately:
+
+    load        csv parse, .npy bundle build (cold) and memory-map (warm)
+    filter      filter index build and selections of hotel types / arrival dates
+    aggregate   compute_data_choice_1/2 per selection, aggregate store build and lookups
+    figure      Plotly figure construction and serialization of each tab
+    callback    full callback round trip through the Dash test client, figure cache
+                miss and hit, and a cross-filter drill-down
+
+Results are written as JSON, one file per run, with the commit, the environment and the
+min/median/mean/max milliseconds of every stage. Compare two runs with `compare`:
+
+    python bench.py run --rows 100000 1000000
+    python bench.py compare results/old.json results/new.json
+"""
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC = os.path.join(ROOT, 'src')
+DATA_DIR = os.path.join(ROOT, 'benchmarks', 'data')
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+
+# Hotel type and arrival date selections: (hotel types, start date, end date)
+SELECTIONS = {'city': (['City Hotel'], None, None),
+              'both': (['City Hotel', 'Resort Hotel'], None, None),
+              'city_quarter': (['City Hotel'], '2016-04-01', '2016-06-30'),
+              'both_year': (['City Hotel', 'Resort Hotel'], '2016-01-01', '2016-12-31')}
+
+# Drill-down clicked on the charts: a month and a market segment
+DRILL = {'arrival_date_month': 'May', 'market_segment': 'Groups'}
+
+
+def measure(fn, repeat):
+    """Run a function repeatedly and summarize its wall-clock time.
+
+    Argument:
+
+        fn: Function without arguments
+        repeat: Number of runs
+
+    Returns:
+       Tuple of the summary dictionary (milliseconds) and the last result of fn.
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append((time.perf_counter() - start) * 1000)
+    summary = {'min': min(times), 'median': float(np.median(times)),
+               'mean': float(np.mean(times)), 'max': max(times), 'runs': repeat}
+    return {key: round(value, 3) for key, value in summary.items()}, result
+
+
+def data_file(rows, seed=0):
+    """Path of the synthetic bookings file of a size, generated on first use."""
+    import synthetic
+
+    os.makedirs(DATA_DIR, exist_ok=True)
+    path = os.path.join(DATA_DIR, f'bookings_{rows}_{seed}.csv')
+    if not os.path.exists(path):
+        tmp_path = path + '.tmp'
+        synthetic.generate(tmp_path, rows, seed)
+        os.replace(tmp_path, path)
+    return path
+
+
+def callback_requests(dash_app, values, changed):
+    """Dash update requests of the callbacks triggered by a changed property.
+
+    Argument:
+
+        dash_app: Dash application
+        values: Dictionary of (component id, property) and value, missing ones are None
+        changed: (component id, property) changed by the user
+
+    Returns:
+       List of JSON payloads for /_dash-update-component, as the browser sends them.
+    """
+    def props(dependencies):
+        return [{'id': d['id'], 'property': d['property'],
+                 'value': values.get((d['id'], d['property']))} for d in dependencies]
+
+    payloads = []
+    for output, callback in dash_app.callback_map.items():
+        if not any((d['id'], d['property']) == changed for d in callback['inputs']):
+            continue
+        # Multi-output callbacks get a list of outputs, single output ones a dictionary
+        outputs = callback['output']
+        if isinstance(outputs, list):
+            outputs = [{'id': o.component_id, 'property': o.component_property} for o in outputs]
+        else:
+            outputs = {'id': outputs.component_id, 'property': outputs.component_property}
+        payloads.append({'output': output,
+                         'outputs': outputs,
+                         'inputs': props(callback['inputs']),
+                         'state': props(callback['state']),
+                         'changedPropIds': ['.'.join(changed)]})
+    return payloads
+
+
+def run(rows, repeat, seed=0):
+    """Time every stage on a synthetic bookings file.
+
+    Argument:
+
+        rows: Number of bookings
+        repeat: Number of runs of every stage
+        seed: Seed of the synthetic data
+
+    Returns:
+       Dictionary of stage name and timing summary.
+    """
+    path = data_file(rows, seed)
+    work_dir = tempfile.mkdtemp(prefix='hotel-bench-')
+    os.environ.update({'HOTEL_DATA_PATH': path,
+                       'HOTEL_DATA_MODE': 'memory',
+                       'HOTEL_DATA_CACHE_DIR': work_dir,
+                       'HOTEL_FIGURE_CACHE_DIR': os.path.join(work_dir, 'figures'),
+                       'HOTEL_INGEST_DIR': os.path.join(work_dir, 'incoming')})
+    sys.path.insert(0, SRC)
+    stages = {}
+
+    try:
+        import dataset
+        from compute import compute_data_choice_1, compute_data_choice_2
+        from aggregates import AggregateStore
+        from filter_index import BookingIndex, day_number
+
+        # Load
+        stages['load.read_csv'], _ = measure(lambda: dataset.read_csv(path), repeat)
+
+        def cold_load():
+            shutil.rmtree(dataset.bundle_path(path), ignore_errors=True)
+            return dataset.load_bookings(path)
+
+        stages['load.bundle_cold'], _ = measure(cold_load, repeat)
+        stages['load.bundle_warm'], df_hotel = measure(lambda: dataset.load_bookings(path), repeat)
+
+        # Filter
+        stages['filter.index_build'], index = measure(lambda: BookingIndex(df_hotel), repeat)
+        selected = {}
+        for name, (hotel_types, start_date, end_date) in SELECTIONS.items():
+            start_day, end_day = day_number(start_date), day_number(end_date)
+            stage, selected[name] = measure(lambda: index.select(hotel_types, start_day, end_day), repeat)
+            stages[f'filter.select.{name}'] = {**stage, 'rows': len(selected[name])}
+
+        # Aggregations
+        for name, rows_selected in selected.items():
+            stages[f'aggregate.compute_data_choice_1.{name}'], _ = measure(
+                lambda: compute_data_choice_1(df_hotel, rows_selected), repeat)
+            stages[f'aggregate.compute_data_choice_2.{name}'], _ = measure(
+                lambda: compute_data_choice_2(df_hotel, rows_selected), repeat)
+        stages['aggregate.store_build'], aggregate_store = measure(lambda: AggregateStore(df_hotel), repeat)
+        for name, selection in SELECTIONS.items():
+            for chart in ('OPT1', 'OPT2'):
+                stages[f'aggregate.store_get.{chart}.{name}'], _ = measure(
+                    lambda: aggregate_store.get(chart, *selection), repeat)
+        for chart in ('OPT1', 'OPT2'):
+            stages[f'aggregate.store_drill.{chart}'], _ = measure(
+                lambda: aggregate_store.get(chart, ['City Hotel'], drill=DRILL), repeat)
+
+        # Worker start: importing the server module loads the data and precomputes
+        stages['app.import'], app = measure(lambda: importlib.import_module('app'), 1)
+
+        # Figures, serialized like get_graph does
+        for chart in ('OPT1', 'OPT2'):
+            stages[f'figure.build.{chart}'], figures = measure(
+                lambda: [app.build_figure(chart, position, ['City Hotel']) for position in range(5)], repeat)
+            stage, payload = measure(
+                lambda: json.dumps([figure.to_plotly_json() for figure in figures], separators=(',', ':')), repeat)
+            stages[f'figure.serialize.{chart}'] = {**stage, 'bytes': len(payload)}
+
+        # Callback round trips through the Dash test client
+        client = app.server.test_client()
+        for chart, changed in (('OPT1', 'input-type'), ('OPT2', 'input-type'),
+                               ('OPT1', 'input-drill'), ('OPT2', 'input-drill')):
+            values = {('input-type', 'value'): chart, ('input-hotel', 'value'): ['City Hotel']}
+            if changed == 'input-drill':
+                values[('input-drill', 'data')] = DRILL
+                payloads = callback_requests(app.app, values, ('input-drill', 'data'))
+            else:
+                payloads = callback_requests(app.app, values, ('input-type', 'value'))
+            kind = 'drill.' if changed == 'input-drill' else ''
+
+            def round_trip():
+                size = 0
+                for payload in payloads:
+                    response = client.post('/_dash-update-component', json=payload)
+                    assert response.status_code == 200, response.status_code
+                    size += len(response.data)
+                return size
+
+            def cold_round_trip():
+                app.figure_cache.clear()
+                return round_trip()
+
+            stage, size = measure(cold_round_trip, repeat)
+            stages[f'callback.{kind}miss.{chart}'] = {**stage, 'bytes': size, 'requests': len(payloads)}
+            stage, size = measure(round_trip, repeat)
+            stages[f'callback.{kind}hit.{chart}'] = {**stage, 'bytes': size, 'requests': len(payloads)}
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return stages
+
+
+def environment():
+    # Commit and versions the results belong to
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=ROOT,
+                                    capture_output=True, text=True, check=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        commit, dirty = None, None
+
+    versions = {}
+    for package in ('numpy', 'pandas', 'plotly', 'dash', 'flask'):
+        try:
+            versions[package] = importlib.import_module(package).__version__
+        except (ImportError, AttributeError):
+            versions[package] = None
+
+    return {'commit': commit, 'dirty': dirty, 'python': platform.python_version(),
+            'machine': platform.machine(), 'cpus': os.cpu_count(), 'packages': versions}
+
+
+def compare(old_path, new_path, threshold):
+    """Print the median time ratio of every stage of two runs.
+
+    Returns:
+       Number of stages slower than the threshold ratio.
+    """
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+
+    regressions = 0
+    print(f"{'stage':<50} {'old ms':>10} {'new ms':>10} {'ratio':>7}")
+    for stage, timing in new['stages'].items():
+        if stage not in old['stages']:
+            continue
+        before, after = old['stages'][stage]['median'], timing['median']
+        ratio = after / before if before else float('inf')
+        slower = ratio > threshold
+        regressions += slower
+        print(f"{stage:<50} {before:>10.2f} {after:>10.2f} {ratio:>7.2f}{'  slower' if slower else ''}")
+    return regressions
+
+
+# Run the benchmarks or compare two result files
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks of the hotel bookings dashboard')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='time every stage on synthetic data')
+    run_parser.add_argument('--rows', type=int, nargs='+', default=[100_000])
+    run_parser.add_argument('--repeat', type=int, default=5)
+    run_parser.add_argument('--seed', type=int, default=0)
+    run_parser.add_argument('--output', help='result file, one per row count by default')
+
+    compare_parser = commands.add_parser('compare', help='compare two result files')
+    compare_parser.add_argument('old')
+    compare_parser.add_argument('new')
+    compare_parser.add_argument('--threshold', type=float, default=1.1,
+                                help='median time ratio counted as a regression')
+
+    args = parser.parse_args()
+    if args.command == 'compare':
+        sys.exit(1 if compare(args.old, args.new, args.threshold) else 0)
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    for rows in args.rows:
+        # Every size runs in a fresh process, modules load the data at import
+        if len(args.rows) > 1:
+            command = [sys.executable, __file__, 'run', '--rows', str(rows), '--repeat', str(args.repeat),
+                       '--seed', str(args.seed)]
+            subprocess.run(command, check=True)
+            continue
+
+        result = {**environment(), 'rows': rows, 'seed': args.seed, 'repeat': args.repeat,
+                  'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+                  'stages': run(rows, args.repeat, args.seed)}
+        output = args.output or os.path.join(
+            RESULTS_DIR, f"{result['commit'] or 'unknown'}-{rows}-{time.strftime('%Y%m%d%H%M%S')}.json")
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, 'w') as f:
+            json.dump(result, f, indent=2)
+        print(output)
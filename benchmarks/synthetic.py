@@ -0,0 +1,139 @@
+# Import required libraries
+import sys
+
+import numpy as np
+import pandas as pd
+
+"""Synthetic hotel bookings with the columns of hotel_bookings_cleaned.csv
+
+The bookings are drawn from fixed distributions close to the real data (hotel types,
+cancellation rate, arrival dates between July 2015 and August 2017, stays, guests,
+meals, countries, market segments, room types, prices and special requests). The file
+is written a chunk at a time, so any number of rows (100k to 50M and more) can be
+generated with bounded memory; the same rows and seed always give the same file.
+
+    python synthetic.py 1000000 bookings_1m.csv [seed]
+"""
+
+MONTHS = ['January', 'February', 'March', 'April', 'May', 'June', 'July',
+          'August', 'September', 'October', 'November', 'December']
+
+FIRST_ARRIVAL = np.datetime64('2015-07-01')
+LAST_ARRIVAL = np.datetime64('2017-08-31')
+
+# Most frequent origin countries first, the rest share a long tail
+COUNTRIES = ['PRT', 'GBR', 'FRA', 'ESP', 'DEU', 'ITA', 'IRL', 'BEL', 'BRA', 'NLD', 'USA',
+             'CHE', 'CN', 'AUT', 'SWE', 'CHN', 'POL', 'ISR', 'RUS', 'NOR', 'ROU', 'FIN',
+             'DNK', 'AUS', 'AGO', 'LUX', 'MAR', 'TUR', 'HUN', 'ARG', 'JPN', 'CZE', 'IND',
+             'KOR', 'GRC', 'DZA', 'SRB', 'HRV', 'MEX', 'IRN', 'EST', 'LTU', 'BGR', 'NZL',
+             'COL', 'UKR', 'MOZ', 'CHL', 'SVK', 'THA', 'ZAF', 'ISL', 'SVN', 'LVA', 'CYP',
+             'TWN', 'ARE', 'SAU', 'NGA', 'PHL', 'SGP', 'TUN', 'IDN', 'PER', 'EGY', 'URY']
+
+# Value and probability of the categorical columns
+CHOICES = {'hotel': (['City Hotel', 'Resort Hotel'], [0.66, 0.34]),
+           'meal': (['BB', 'HB', 'SC', 'FB', 'Undefined'], [0.77, 0.12, 0.09, 0.01, 0.01]),
+           'market_segment': (['Online TA', 'Offline TA/TO', 'Groups', 'Direct', 'Corporate',
+                               'Complementary', 'Aviation', 'Undefined'],
+                              [0.47, 0.2, 0.16, 0.1, 0.05, 0.015, 0.0049, 0.0001]),
+           'distribution_channel': (['TA/TO', 'Direct', 'Corporate', 'GDS'], [0.82, 0.12, 0.055, 0.005]),
+           'reserved_room_type': (list('ADEFGBCHPL'),
+                                  [0.72, 0.16, 0.055, 0.025, 0.018, 0.009, 0.008, 0.004, 0.0005, 0.0005]),
+           'deposit_type': (['No Deposit', 'Non Refund', 'Refundable'], [0.876, 0.122, 0.002]),
+           'customer_type': (['Transient', 'Transient-Party', 'Contract', 'Group'], [0.75, 0.21, 0.035, 0.005]),
+           'adults': ([1, 2, 3, 4], [0.2, 0.7, 0.08, 0.02]),
+           'children': ([0.0, 1.0, 2.0, 3.0], [0.93, 0.04, 0.029, 0.001]),
+           'babies': ([0, 1, 2], [0.992, 0.0075, 0.0005]),
+           'total_of_special_requests': ([0, 1, 2, 3, 4, 5], [0.589, 0.278, 0.109, 0.021, 0.0028, 0.0002])}
+
+
+def bookings(rows, rng):
+    """Dataframe of synthetic bookings.
+
+    Argument:
+
+        rows: Number of bookings
+        rng: numpy random Generator
+
+    Returns:
+       Dataframe with the columns of hotel_bookings_cleaned.csv.
+    """
+    def choice(name):
+        values, p = CHOICES[name]
+        codes = rng.choice(len(values), rows, p=p)
+        if isinstance(values[0], str):
+            # Labels as categoricals, plain string arrays are slow to build and write
+            return pd.Categorical.from_codes(codes, values)
+        return np.asarray(values)[codes]
+
+    span = int((LAST_ARRIVAL - FIRST_ARRIVAL).astype(np.int64)) + 1
+    arrival = pd.DatetimeIndex(FIRST_ARRIVAL + rng.integers(0, span, rows).astype('timedelta64[D]'))
+    hotel = choice('hotel')
+    is_canceled = (rng.random(rows) < np.where(hotel == 'City Hotel', 0.42, 0.28)).astype(np.int64)
+    lead_time = rng.gamma(1.0, 104.0, rows).astype(np.int64)
+
+    # Countries follow a Zipf like popularity
+    weights = 1.0 / np.arange(1, len(COUNTRIES) + 1) ** 1.3
+    country = pd.Categorical.from_codes(rng.choice(len(COUNTRIES), rows, p=weights / weights.sum()), COUNTRIES)
+
+    # Prices are higher in summer
+    season = 1 + 0.35 * np.sin((arrival.month.to_numpy() - 4) / 12 * 2 * np.pi)
+    adr = np.round(rng.gamma(6.0, 17.0, rows) * season, 2)
+
+    status = pd.Categorical.from_codes(np.where(is_canceled == 1, np.where(rng.random(rows) < 0.97, 1, 2), 0),
+                                       ['Check-Out', 'Canceled', 'No-Show'])
+    status_date = np.where(is_canceled == 1, arrival - pd.to_timedelta(lead_time // 2, unit='D'), arrival)
+
+    return pd.DataFrame({
+        'hotel': hotel,
+        'is_canceled': is_canceled,
+        'lead_time': lead_time,
+        'arrival_date_year': arrival.year,
+        'arrival_date_month': pd.Categorical.from_codes(arrival.month - 1, MONTHS),
+        'arrival_date_week_number': arrival.isocalendar().week.to_numpy().astype(np.int64),
+        'arrival_date_day_of_month': arrival.day,
+        'stays_in_weekend_nights': rng.poisson(0.9, rows),
+        'stays_in_week_nights': rng.poisson(2.5, rows),
+        'adults': choice('adults'),
+        'children': choice('children'),
+        'babies': choice('babies'),
+        'meal': choice('meal'),
+        'country': country,
+        'market_segment': choice('market_segment'),
+        'distribution_channel': choice('distribution_channel'),
+        'is_repeated_guest': (rng.random(rows) < 0.03).astype(np.int64),
+        'previous_cancellations': rng.poisson(0.09, rows),
+        'previous_bookings_not_canceled': rng.poisson(0.14, rows),
+        'reserved_room_type': choice('reserved_room_type'),
+        'assigned_room_type': choice('reserved_room_type'),
+        'booking_changes': rng.poisson(0.22, rows),
+        'deposit_type': choice('deposit_type'),
+        'agent': rng.integers(1, 536, rows).astype(np.float64),
+        'days_in_waiting_list': np.where(rng.random(rows) < 0.03, rng.integers(1, 200, rows), 0),
+        'customer_type': choice('customer_type'),
+        'adr': adr,
+        'required_car_parking_spaces': (rng.random(rows) < 0.06).astype(np.int64),
+        'total_of_special_requests': choice('total_of_special_requests'),
+        'reservation_status': status,
+        'reservation_status_date': np.datetime_as_string(status_date.astype('datetime64[D]')),
+    })
+
+
+def generate(path, rows, seed=0, chunk_rows=1_000_000):
+    """Write a csv file of synthetic bookings.
+
+    Argument:
+
+        path: Path of the csv file
+        rows: Number of bookings
+        seed: Seed of the random generator
+        chunk_rows: Number of bookings generated and written at a time
+    """
+    for i, start in enumerate(range(0, rows, chunk_rows)):
+        rng = np.random.default_rng([seed, i])
+        df = bookings(min(chunk_rows, rows - start), rng)
+        df.to_csv(path, mode='w' if i == 0 else 'a', header=i == 0, index=False)
+
+
+# Write a synthetic csv file
+if __name__ == '__main__':
+    generate(sys.argv[2], int(sys.argv[1]), int(sys.argv[3]) if len(sys.argv) > 3 else 0)
@@ -0,0 +1,29 @@
+# Gunicorn settings of the dashboard, used by the start command in render.yaml
+import os
+import sys
+
+# The dashboard modules live in src, next to the data file
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+
+# The browser sends one callback request per chart; threads let a worker serve the
+# charts of a selection at the same time (gthread worker)
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+
+
+def on_starting(server):
+    # Convert the csv into the .npy column bundle once in the master process and
+    # aggregate its bookings there with a pool of processes (the master runs no other
+    # threads). The workers then only memory-map the bundle and load the tables,
+    # sharing the pages read-only instead of each parsing and aggregating the csv.
+    import dataset
+    import precompute
+
+    # Streamed histories are never loaded as a whole, there is nothing to prepare
+    if dataset.DATA_MODE == 'stream':
+        return
+    try:
+        precompute.prepare(os.path.join(server.cfg.chdir, dataset.DATA_PATH))
+    except OSError as error:
+        # A read-only or missing cache directory must not stop the server, the
+        # workers fall back to parsing the csv (see dataset.load_bookings)
+        server.log.warning('Could not prepare the column bundle: %s', error)
@@ -0,0 +1,397 @@
+# Import required libraries
+import threading
+
+import numpy as np
+import pandas as pd
+
+from dataset import CHUNK_ROWS, columns_frame, read_chunks
+from engine import CUBES, REPORTS, BookingAggregates, drill_filters, table_names
+from filter_index import BookingIndex, day_number
+from metrics import metrics
+from precompute import aggregate
+
+"""Precomputed aggregate store for the hotel bookings report
+
+The count/sum tables of both tabs are aggregated once over all bookings when the data
+is loaded, and the report of every single hotel type is derived from them up front.
+Several hotel types are summed from the same tables; only an arrival date range needs
+a new aggregation, over the rows picked by the filter index. The drill-down cubes are
+aggregated and updated with the other tables, a drill-down slices them. New bookings and
+cancellation changes are folded into the tables incrementally (see ingest.py).
+
+The bookings are kept in segments, the loaded bookings first, then the ingested ones.
+A segment either holds its rows in a dataframe or, for histories larger than memory,
+reads them from the source file in chunks whenever they are needed; both aggregate
+their rows into the same mergeable tables.
+"""
+
+
+def hotel_selection(hotel_type):
+    """Selected hotel types as a sorted tuple.
+
+    Argument:
+
+        hotel_type: Value of the hotel dropdown, None, a single hotel type or a list
+
+    Returns:
+       Tuple of hotel types.
+    """
+    if hotel_type is None:
+        return ()
+    if isinstance(hotel_type, str):
+        return (hotel_type,)
+    return tuple(sorted(set(hotel_type)))
+
+
+class _FrameSegment:
+    """Bookings held in a dataframe, with their filter index.
+
+    Argument:
+
+        df_hotel: Hotel dataframe
+        index: BookingIndex of the dataframe, None builds it
+    """
+
+    def __init__(self, df_hotel, index=None):
+        self.df = df_hotel
+        self.index = BookingIndex(df_hotel) if index is None else index
+        # Rows of the latest selection, shared by the chart callbacks of the selection
+        self._selected = (None, None)
+
+    def __len__(self):
+        return len(self.df)
+
+    @property
+    def hotel_types(self):
+        return self.index.hotel_types
+
+    @property
+    def days(self):
+        return self.index.min_day, self.index.max_day
+
+    def covers(self, start_date, end_date):
+        return self.index.covers(start_date, end_date)
+
+    def aggregate(self, hotel_types, start_date, end_date, charts, tables=None):
+        with metrics.stage('filter') as sizes:
+            key = (hotel_types, start_date, end_date)
+            selected_key, rows = self._selected
+            if selected_key != key:
+                rows = self.index.select(hotel_types, start_date, end_date)
+                self._selected = (key, rows)
+            sizes['rows'] = len(rows)
+        with metrics.stage('aggregate', rows=len(rows)):
+            return BookingAggregates.from_frame(self.df, rows, charts=charts, tables=tables)
+
+    def extend(self, bookings):
+        return _FrameSegment(pd.concat([self.df, bookings], ignore_index=True))
+
+    def with_status(self, rows, is_canceled):
+        """Segment with a new cancellation status of some bookings.
+
+        Argument:
+
+            rows: Sorted positions of the changed bookings in the segment
+            is_canceled: New status of the bookings
+
+        Returns:
+           Tuple of the new segment and the aggregates of the bookings before and
+           after the change.
+        """
+        before = BookingAggregates.from_frame(self.df, rows)
+
+        # The loaded columns may be shared read-only maps, only this column is copied
+        column = self.df['is_canceled'].to_numpy().copy()
+        column[rows] = is_canceled
+        df = columns_frame({**{name: self.df[name] for name in self.df.columns},
+                            'is_canceled': column})
+
+        # Hotel types and arrival dates never change, the index stays valid
+        return _FrameSegment(df, self.index), before, BookingAggregates.from_frame(df, rows)
+
+
+class _StreamedSegment:
+    """Bookings of a csv or Parquet file read in chunks, never loaded as a whole.
+
+    Argument:
+
+        path: Path of the source file
+        chunk_rows: Maximum number of rows per chunk
+        status: Dictionary of row position and changed cancellation status
+
+    Call scan() once to aggregate every booking and learn the rows, hotel types and
+    arrival dates of the file. Selections the precomputed tables cannot answer read
+    the file again, so memory use depends on the chunk size only. One read computes
+    every table of the selection, the charts of the selection share it.
+    """
+
+    def __init__(self, path, chunk_rows=CHUNK_ROWS, status=None):
+        self.path = path
+        self.chunk_rows = chunk_rows
+        self.status = {} if status is None else status
+        self.rows = 0
+        self.hotel_types = []
+        self.days = (None, None)
+        # Tables of the latest selection; the lock makes the concurrent chart requests
+        # of a selection wait for one read of the file instead of each reading it
+        self._selected = (None, None)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self.rows
+
+    def _chunks(self):
+        # Chunks of the file with their first row position, changed statuses applied
+        positions = np.array(sorted(self.status), dtype=np.int64)
+        offset = 0
+        for chunk in read_chunks(self.path, self.chunk_rows):
+            lo, hi = np.searchsorted(positions, [offset, offset + len(chunk)])
+            if hi > lo:
+                column = chunk['is_canceled'].to_numpy().copy()
+                column[positions[lo:hi] - offset] = [self.status[p] for p in positions[lo:hi]]
+                chunk = chunk.assign(is_canceled=column)
+            yield offset, chunk
+            offset += len(chunk)
+
+    def scan(self):
+        """Aggregate every booking of the file, one chunk at a time.
+
+        Returns:
+           BookingAggregates of the file.
+        """
+        booking_aggregates = None
+        rows, hotel_types, days = 0, set(), []
+
+        for _, chunk in self._chunks():
+            partial = BookingAggregates.from_frame(chunk)
+            booking_aggregates = partial if booking_aggregates is None else booking_aggregates.merge(partial)
+
+            index = BookingIndex(chunk)
+            rows += len(chunk)
+            hotel_types.update(index.hotel_types)
+            days += [day for day in (index.min_day, index.max_day) if day is not None]
+
+        if booking_aggregates is None:
+            raise ValueError(f'no bookings in {self.path}')
+
+        self.rows, self.hotel_types = rows, sorted(hotel_types)
+        self.days = (min(days), max(days)) if days else (None, None)
+        return booking_aggregates
+
+    def covers(self, start_date, end_date):
+        min_day, max_day = self.days
+        return ((start_date is None or min_day is None or start_date <= min_day)
+                and (end_date is None or max_day is None or end_date >= max_day))
+
+    def aggregate(self, hotel_types, start_date, end_date, charts, tables=None):
+        key = (hotel_types, start_date, end_date)
+        with self._lock:
+            selected_key, selected = self._selected
+            if selected_key != key:
+                selected = None
+                with metrics.stage('aggregate.stream', rows=0) as sizes:
+                    for _, chunk in self._chunks():
+                        rows = BookingIndex(chunk).select(hotel_types, start_date, end_date)
+                        partial = BookingAggregates.from_frame(chunk, rows)
+                        selected = partial if selected is None else selected.merge(partial)
+                        sizes['rows'] += len(rows)
+                self._selected = (key, selected)
+
+        if selected is None:
+            return None
+        return BookingAggregates({name: selected.tables[name] for name in table_names(charts, tables)})
+
+    def with_status(self, rows, is_canceled):
+        # Same as _FrameSegment.with_status, reading the changed bookings in one pass
+        status = {**self.status, **dict(zip(rows.tolist(), np.asarray(is_canceled).tolist()))}
+        segment = _StreamedSegment(self.path, self.chunk_rows, status)
+        segment.rows, segment.hotel_types, segment.days = self.rows, self.hotel_types, self.days
+
+        before = after = None
+        for offset, chunk in self._chunks():
+            lo, hi = np.searchsorted(rows, [offset, offset + len(chunk)])
+            if hi == lo:
+                continue
+            chunk_rows = rows[lo:hi] - offset
+            old = BookingAggregates.from_frame(chunk, chunk_rows)
+            column = chunk['is_canceled'].to_numpy().copy()
+            column[chunk_rows] = np.asarray(is_canceled)[lo:hi]
+            new = BookingAggregates.from_frame(chunk.assign(is_canceled=column), chunk_rows)
+            before = old if before is None else before.merge(old)
+            after = new if after is None else after.merge(new)
+        return segment, before, after
+
+
+class AggregateStore:
+    """Dataframes of both report tabs, keyed by hotel type.
+
+    Argument:
+
+        df_hotel: Full hotel bookings dataframe, None leaves the store empty until
+                  build() or stream() is called
+        workers: Number of processes aggregating the bookings (see precompute.py), 1
+                 aggregates serially
+
+    The reports come from the same aggregation engine as compute_data_choice_1 and
+    compute_data_choice_2, so a lookup returns what they would return for the selection.
+    Call build() (or stream()) again when the data is reloaded.
+    """
+
+    def __init__(self, df_hotel=None, workers=1):
+        if df_hotel is not None:
+            self.build(df_hotel, workers)
+
+    def build(self, df_hotel, workers=1, booking_aggregates=None):
+        """Build the store from a dataframe of bookings.
+
+        Argument:
+
+            df_hotel: Full hotel bookings dataframe
+            workers: Number of processes aggregating the bookings, 1 aggregates serially
+            booking_aggregates: BookingAggregates of df_hotel, e.g. loaded with
+                                precompute.load_prepared(), None aggregates the bookings
+        """
+        segment = _FrameSegment(df_hotel)
+        if booking_aggregates is None:
+            booking_aggregates = aggregate(df_hotel, segment.index, workers)
+        self._install([segment], booking_aggregates)
+
+    def stream(self, path, chunk_rows=CHUNK_ROWS):
+        """Build the store from a csv or Parquet file read in chunks.
+
+        Argument:
+
+            path: Path of the source file
+            chunk_rows: Maximum number of rows per chunk
+
+        The chunks are aggregated one at a time and their tables merged, the same
+        tables build() computes from the whole dataframe.
+        """
+        segment = _StreamedSegment(path, chunk_rows)
+        self._install([segment], segment.scan())
+
+    def _install(self, segments, booking_aggregates):
+        hotel_types = sorted({hotel_type for segment in segments for hotel_type in segment.hotel_types})
+        reports = {}
+
+        # No hotel type selected (or an unknown one) selects no booking
+        reports[()] = self._reports(booking_aggregates, ())
+
+        # One entry per hotel type over all arrival dates
+        for hotel_type in hotel_types:
+            reports[(hotel_type,)] = self._reports(booking_aggregates, (hotel_type,))
+
+        # Swap everything at once so a lookup never sees a half built store
+        self._state = (segments, hotel_types, booking_aggregates, reports)
+
+    @property
+    def loaded_rows(self):
+        """Number of bookings loaded from the data file, before any ingested one."""
+        return len(self._state[0][0])
+
+    def date_range(self):
+        """First and last arrival date of the bookings as 'YYYY-MM-DD' strings."""
+        days = [day for segment in self._state[0] for day in segment.days if day is not None]
+        if not days:
+            return None, None
+        return tuple(str(np.datetime64(day, 'D')) for day in (min(days), max(days)))
+
+    def ingest(self, bookings, status):
+        """Fold new bookings and cancellation status changes into the store.
+
+        Argument:
+
+            bookings: Dataframe of new bookings with the dataset.SCHEMA columns
+            status: List of {'booking_id': id, 'is_canceled': 0 or 1} changes, booking
+                    ids are row positions over the loaded and the new bookings
+
+        Only the new and changed bookings are aggregated, their tables are added to
+        (or, for the previous status of a changed booking, removed from) the tables of
+        the store.
+        """
+        segments, _, booking_aggregates, _ = self._state
+        segments = list(segments)
+
+        # New bookings go to a separate segment after the loaded (shared) bookings
+        if len(bookings):
+            booking_aggregates = booking_aggregates.merge(BookingAggregates.from_frame(bookings))
+            if len(segments) == 1:
+                segments.append(_FrameSegment(bookings.reset_index(drop=True)))
+            else:
+                segments[1] = segments[1].extend(bookings)
+
+        # Last change of a booking wins
+        changes = {change['booking_id']: change['is_canceled'] for change in status}
+        booking_ids = np.array(sorted(changes), dtype=np.int64)
+        is_canceled = np.array([changes[booking_id] for booking_id in booking_ids], dtype=np.int8)
+
+        offset = 0
+        for i, segment in enumerate(segments):
+            in_segment = (booking_ids >= offset) & (booking_ids < offset + len(segment))
+            rows = booking_ids[in_segment] - offset
+            offset += len(segment)
+            if not len(rows):
+                continue
+
+            # Swap the old status of the bookings for the new one
+            segments[i], before, after = segment.with_status(rows, is_canceled[in_segment])
+            booking_aggregates = booking_aggregates.merge(before.negate()).merge(after)
+
+        self._install(segments, booking_aggregates)
+
+    def get(self, chart, hotel_type, start_date=None, end_date=None, position=None, drill=None):
+        """Return the dataframes of a report tab for a selection.
+
+        Argument:
+
+            chart: Report tab ('OPT1' or 'OPT2')
+            hotel_type: Selected hotel type(s)
+            start_date: First arrival date ('YYYY-MM-DD'), None leaves the range open
+            end_date: Last arrival date ('YYYY-MM-DD'), None leaves the range open
+            position: Position of one chart of the tab (0 to 4), None selects every chart
+            drill: Dictionary of drill-down level and selected label (arrival month,
+                   market segment), None selects every booking
+
+        Returns:
+           Tuple of dataframes, as returned by compute_data_choice_1/compute_data_choice_2,
+           or the dataframe of the chart at position. Only the table of that chart is
+           aggregated for an arrival date range. A drill-down is sliced from the cubes.
+        """
+        if position is None and drill:
+            return tuple(self.get(chart, hotel_type, start_date, end_date, position, drill)
+                         for position in range(len(REPORTS[chart])))
+
+        segments, all_hotel_types, booking_aggregates, reports = self._state
+
+        hotel_types = tuple(h for h in hotel_selection(hotel_type) if h in all_hotel_types)
+        start_date, end_date = day_number(start_date), day_number(end_date)
+        filters = drill_filters(chart, position, drill) if drill else ()
+
+        if all(segment.covers(start_date, end_date) for segment in segments):
+            if filters:
+                with metrics.stage('drill_down'):
+                    table = REPORTS[chart][position][0]
+                    return booking_aggregates.drill_down(filters, (table,)).report(chart, hotel_types, position)
+            if hotel_types in reports:
+                report = reports[hotel_types][chart]
+                return report if position is None else report[position]
+            with metrics.stage('report'):
+                return booking_aggregates.report(chart, hotel_types, position)
+
+        # Aggregate the selected rows of every segment and add the tables up
+        tables = None
+        if position is not None:
+            table = REPORTS[chart][position][0]
+            tables = (CUBES[table],) if filters else (table,)
+        selected = None
+        for segment in segments:
+            partial = segment.aggregate(hotel_types, start_date, end_date, (chart,), tables)
+            selected = partial if selected is None else selected.merge(partial)
+        with metrics.stage('report'):
+            if filters:
+                selected = selected.drill_down(filters, (table,))
+            return selected.report(chart, position=position)
+
+    @staticmethod
+    def _reports(booking_aggregates, hotel_types):
+        return {chart: booking_aggregates.report(chart, hotel_types) for chart in ('OPT1', 'OPT2')}
@@ -1,26 +1,21 @@
 # Import required libraries
-import pandas as pd
-import dash
-from dash import Dash, dcc, html, Input, Output, State
-from dash.dependencies import Input, Output, State
-import plotly.graph_objects as go
-import plotly.express as px
-from plotly.offline import iplot
-from dash import no_update
-import jupyter_dash
-from jupyter_dash import JupyterDash
-
-import numpy as np
-import matplotlib as mpl
-import matplotlib.pyplot as plt
-import seaborn as sns
-mpl.style.use('ggplot')
-
-import sort_dataframeby_monthorweek as sd
-from sorted_months_weekdays import Month_Sorted_Month,Weekday_Sorted_Week
-
-# Create a dash application
-app = jupyter_dash.JupyterDash(__name__)
+import json
+import os
+import threading
+import time
+from dash import ALL, Dash, dcc, html, Input, Output, State, callback_context, no_update
+from flask import g, jsonify, request
+
+from aggregates import AggregateStore, hotel_selection
+from dataset import DATA_MODE, DATA_PATH, bookings_frame, file_version, load_bookings
+from engine import drill_filters
+from figure_cache import FigureCache
+from ingest import INGEST_DIR, BookingLog
+from metrics import PROFILE_DIR, PROFILE_SLOW_MS, SamplingProfiler, metrics
+from precompute import prepared
+
+# Create a dash application, the notebook version lives in notebook_app.py
+app = Dash(__name__)
 
 # Server
 server = app.server
@@ -28,90 +23,60 @@ server = app.server
 # Clear the layout and do not display exception till callback gets executed
 app.config.suppress_callback_exceptions = True
 
-# Read the cleaned hotel data into pandas dataframe
-df_hotel = pd.read_csv("hotel_bookings_cleaned.csv")
+# Precompute the report dataframes of every hotel type once, callbacks only look them up
+def load_data(aggregate_store):
+    if DATA_MODE == 'stream':
+        # Booking histories larger than memory are aggregated chunk by chunk
+        aggregate_store.stream(DATA_PATH)
+    else:
+        # The bookings and their aggregates are prepared once per csv version, with a
+        # pool of processes (see precompute.py)
+        loaded = prepared(DATA_PATH)
+        if loaded is None:
+            # Read the report columns of the cleaned hotel data into a typed pandas dataframe
+            aggregate_store.build(load_bookings(DATA_PATH))
+        else:
+            df_hotel, booking_aggregates = loaded
+            aggregate_store.build(df_hotel, booking_aggregates=booking_aggregates)
+    return aggregate_store
 
-"""Compute graph data for creating hotel bookings report 
+csv_version = file_version(DATA_PATH)
+aggregate_store = load_data(AggregateStore())
 
-Function that takes hotel data as input and create dataframes based on the grouping condition
-to be used for plottling charts and graphs.
+# New bookings and cancellation changes, applied batches are part of the dataset version
+booking_log = BookingLog(INGEST_DIR, csv_version, aggregate_store.loaded_rows)
+applied_batches = 0
+dataset_version = None
+data_lock = threading.Lock()
 
-Argument:
-     
-    df_hotel: Filtered dataframe
-    
-Returns:
-   Dataframes to create graph. 
-"""
+# Serialized figures shared by all workers, keyed by dataset version
+figure_cache = FigureCache()
 
-def compute_data_choice_1(df_hotel):
-    
-    # df with only not cancelled (nc) bookings
-    df_hotel_nc = df_hotel[df_hotel['is_canceled']==0]
-    
-    # Mean monthly price per hotel type (over the year)
-    df_hotel_nc_mean_price = df_hotel_nc.groupby('arrival_date_month')['adr'].mean().reset_index()
-    df_hotel_nc_mean_price.columns = ['Month','Monthly Price']
-    df_hotel_nc_mean_price_ord = sd.Sort_Dataframeby_Month(df_hotel_nc_mean_price, 'Month')
-    
-    # Nr of bookings per month per hotel type
-    df_monthly_bookings = df_hotel['arrival_date_month'].value_counts().to_frame().reset_index()
-    df_monthly_bookings.columns = ['Month','Nr of Bookings']
-    df_monthly_bookings_ord = sd.Sort_Dataframeby_Month(df_monthly_bookings, 'Month')
-    
-    # Nr bookings per nights of stay per hotel type
-    df_hotel_nc['Total_nights'] = df_hotel_nc['stays_in_weekend_nights'] + df_hotel_nc['stays_in_week_nights']
-    df_stays = df_hotel_nc.groupby('Total_nights').agg('count').reset_index()
-    df_stays = df_stays.iloc[:,0:2]
-    df_stays.columns = ['Total nights', 'Nr of stays']
-    
-    # Nr of bookings per market segment
-    df_market = df_hotel_nc['market_segment'].value_counts().to_frame().reset_index()
-    df_market.columns = ['Market segment', 'Nr of bookings']
-
-    # Nr reservations / cancellations per hotel type
-    df_canc_res = df_hotel.groupby('is_canceled').agg('count').reset_index()
-    df_canc_res = df_canc_res.iloc[:,0:2]
-    df_canc_res.columns = ['Reservation Cancellation', 'Count']
-    
-    return df_hotel_nc_mean_price_ord, df_monthly_bookings_ord, df_stays, df_market, df_canc_res
+# Reload the data when the csv file changed and fold in the new batches of bookings
+def refresh_data():
+    global csv_version, booking_log, applied_batches, dataset_version
 
-def compute_data_choice_2(df_hotel):
-    
-    # df with only not cancelled (nc) bookings
-    df_hotel_nc = df_hotel[df_hotel['is_canceled']==0]
-    
-    # Nr of guests per month per hotel type
-    df_hotel_nc['Tot_guests_per_booking'] = df_hotel_nc[['adults', 'children', 'babies']].sum(axis=1)
-    df_guests_month = df_hotel_nc.groupby('arrival_date_month')['Tot_guests_per_booking'].sum().to_frame().reset_index()
-    df_guests_month.columns = ['Month', 'Total guests']
-    df_guests_month = sd.Sort_Dataframeby_Month(df_guests_month, 'Month')
-    
-    # Nr of bookings per nr of special request per cancelled/not cancelled
-    df_cancel_req = df_hotel.groupby('total_of_special_requests')['is_canceled'].value_counts().to_frame()
-    df_cancel_req.columns = ['Nr of bookings']
-    df_cancel_req = df_cancel_req.reset_index()
-    df_cancel_req.columns = ['Special requests', 'Cancelled (1)/Not cancelled (0)', 'Nr of bookings']
-    df_cancel_req['Cancelled (1)/Not cancelled (0)'] = df_cancel_req['Cancelled (1)/Not cancelled (0)'].astype(str)
-    
-    # Nr of bookings per nr of special requests per reserved room type
-    df_room_req = df_hotel.groupby('total_of_special_requests')['reserved_room_type'].value_counts().to_frame()
-    df_room_req.columns = ['Nr of bookings']
-    df_room_req = df_room_req.reset_index()
-    df_room_req.columns = ['Special requests', 'Room type', 'Nr of bookings']
-    
-    # Preferred meal types per room types
-    df_meal_room = df_hotel_nc.groupby('meal')['reserved_room_type'].value_counts().to_frame()
-    df_meal_room.columns = ['Nr of preferences']
-    df_meal_room.index.name = 'meal_type'
-    df_meal_room = df_meal_room.reset_index()
-    df_meal_room.columns = ['Meal', 'Room type', 'Nr of preferences']
-    
-    # Origin countries of guests
-    df_map = df_hotel_nc['country'].value_counts().reset_index()
-    df_map.columns = ['Country', 'Guests']
-    
-    return df_guests_month, df_cancel_req, df_room_req, df_meal_room, df_map
+    with data_lock, metrics.stage('refresh'):
+        version = file_version(DATA_PATH)
+        if version != csv_version:
+            load_data(aggregate_store)
+            csv_version = version
+            booking_log = BookingLog(INGEST_DIR, csv_version, aggregate_store.loaded_rows)
+            applied_batches = 0
+
+        for batch in booking_log.read_from(applied_batches):
+            aggregate_store.ingest(bookings_frame(batch['bookings']), batch['status'])
+            applied_batches += 1
+
+        version = f'{csv_version}.{applied_batches}'
+        if version != dataset_version:
+            dataset_version = version
+            figure_cache.discard_other_versions(version)
+        return dataset_version
+
+# Fold in the logged batches before dropping the figures of other versions, a worker
+# (re)start keeps the figures of the version the live workers serve
+refresh_data()
 
 # Application layout
 app.layout = html.Div(children=[ 
@@ -168,15 +133,35 @@ app.layout = html.Div(children=[
                                                      style={'width':'80%', 'padding':'3px', 'font-size': '20px', 
                                                             'text-align-last' : 'center',
                                                             'backgroundColor':'#01386a', 'color':'snow',
-                                                            'font-family':'Tahoma, sans-serif'}
-                                                     #multi=True
+                                                            'font-family':'Tahoma, sans-serif'},
+                                                     multi=True
                                                     ),
+                                        # Add a division for the arrival date range helper text
+                                        html.Div(
+                                            [
+                                            html.H2('Arrival date', style={'display':'inline', 'margin-right': '2em',
+                                                                           'backgroundColor':'#01386a',
+                                                                           'color':'snow',
+                                                                           'font-family':'Tahoma, sans-serif'})
+                                            ]
+                                        ),
+                                        # Arrival date range, limited to the dates in the data
+                                        dcc.DatePickerRange(id='input-dates',
+                                                            min_date_allowed=aggregate_store.date_range()[0],
+                                                            max_date_allowed=aggregate_store.date_range()[1],
+                                                            display_format='YYYY-MM-DD',
+                                                            clearable=True,
+                                                            style={'font-size': '20px',
+                                                                   'font-family':'Tahoma, sans-serif'}),
                                             # Place them next to each other using the division style
                                             ], style={'display': 'flex','backgroundColor':'#01386a',
                                                       'color':'snow',
                                                       'font-family':'Tahoma, sans-serif'}),  
                                           ]),
                                 
+                                # Drill-down labels clicked on the charts, e.g. {'arrival_date_month': 'May'}
+                                dcc.Store(id='input-drill', data={}),
+
                                 # Add Computed graphs
                                 # Added an empty division and provided an id that will be updated
                                 # during callback
@@ -196,188 +181,177 @@ app.layout = html.Div(children=[
                                 ])
 
 
-# Callback function definition
-@app.callback( [Output(component_id='plot1', component_property='children'),
-                Output(component_id='plot2', component_property='children'),
-                Output(component_id='plot3', component_property='children'),
-                Output(component_id='plot4', component_property='children'),
-                Output(component_id='plot5', component_property='children')],
-               [Input(component_id='input-type', component_property='value'),
-                Input(component_id='input-hotel', component_property='value')],
-               # Holding output state till user enters all the form information.
-               # In this case, it will be chart type
-               [State("plot1", 'children'), State("plot2", "children"),
-                State("plot3", "children"), State("plot4", "children"),
-                State("plot5", "children")
-               ])
-
-# Add computation to callback function and return graph
-def get_graph(chart, hotel_type, children1, children2, children3, children4, children5): # 
-    # Select data
-    df = df_hotel[df_hotel['hotel']==hotel_type]
-       
-    if chart == 'OPT1': # Hotel Bookings analysis
-
-        # Compute required information for creating graph from the data
-        df_hotel_nc_mean_price_ord, df_monthly_bookings_ord, df_stays, df_market, df_canc_res = compute_data_choice_1(df)
-
-        # Lineplot of avergae monthly room price per hotel type
-        line_price = px.line(df_hotel_nc_mean_price_ord,
-                             x='Month',
-                             y='Monthly Price',
-                             title= f"Monthly mean room-price in {hotel_type}")
-        line_price.update_layout({'plot_bgcolor': '#01386a',
-                                  'paper_bgcolor': '#01386a'},
-                                 font_color="snow",
-                                 title_font_size = 23,
-                                 xaxis=dict(showgrid=False),
-                                 yaxis=dict(showgrid=False))
-        line_price.update_traces(line_color='#a2cffe')
-              
-        # Lineplot Nr of bookings per month per hotel type
-        line_booking = px.line(df_monthly_bookings_ord,
-                            x='Month',
-                            y='Nr of Bookings',
-                            title= f"Monthly bookings in {hotel_type}")
-        line_booking.update_layout({'plot_bgcolor': '#01386a',
-                                    'paper_bgcolor': '#01386a'},
-                                    font_color="snow",
-                                    title_font_size = 23,
-                                    xaxis=dict(showgrid=False),
-                                    yaxis=dict(showgrid=False))
-        line_booking.update_traces(line_color='#a2cffe')
-        
-        # Barplot Nr of bookings per nr of nights of stay per hotel type
-        bar_stays = px.bar(df_stays,
-                           x = 'Total nights',
-                           y = 'Nr of stays',
-                           text = 'Nr of stays',
-                           barmode = 'group',
-                           height = 400,
-                           title = f"Bookings per nights of stay in {hotel_type}")
-        bar_stays.update_layout({'plot_bgcolor': '#01386a',
-                                  'paper_bgcolor': '#01386a'},
-                                  font_color="snow",
-                                  title_font_size = 23,
-                                  xaxis=dict(showgrid=False),
-                                  yaxis=dict(showgrid=False))
-        bar_stays.update_traces(marker_color='#a2cffe')
-        
-        # Pie chart nr of bookings per market segment ['Market segment', 'Nr of bookings']
-        pie_market = px.pie(df_market,
-                            values = 'Nr of bookings',
-                            names = 'Market segment',
-                            title = f'Bookings per market segment in {hotel_type}')
-        pie_market.update_layout({'plot_bgcolor': '#01386a',
-                                  'paper_bgcolor': '#01386a'},
-                                  font_color="snow",
-                                  title_font_size = 23)
-        
-        # Barplot nr of cancellations / reservations per hotel type
-        bar_canc_res = px.bar(df_canc_res,
-                              x='Reservation Cancellation',
-                              y='Count',
-                              barmode='group',
-                              height=400,
-                              title=f'Cancellations (1) and reservations (0) in {hotel_type}')
-        bar_canc_res.update_layout({'plot_bgcolor': '#01386a',
-                                    'paper_bgcolor': '#01386a'},
-                                    font_color="snow",
-                                    title_font_size = 23,
-                                    xaxis=dict(showgrid=False),
-                                    yaxis=dict(showgrid=False))
-        bar_canc_res.update_traces(marker_color='#a2cffe')
-
-
-        # Return dcc.Graph component to the empty division
-        return [dcc.Graph(figure = line_price), 
-                dcc.Graph(figure = line_booking),
-                dcc.Graph(figure = bar_stays),
-                dcc.Graph(figure = pie_market),
-                dcc.Graph(figure = bar_canc_res)
-               ]
-    
-    elif chart == 'OPT2': 
-        # HOTEL GUESTS ANALYSIS
-        df_guests_month, df_cancel_req, df_room_req, df_meal_room, df_map = compute_data_choice_2(df)
-        
-        # Lineplot nr of guests per month per hotel type
-        line_guests_month = px.line(df_guests_month,
-                                    x='Month',
-                                    y= 'Total guests',
-                                    title=f'Monthly guests in {hotel_type}')
-        line_guests_month.update_layout({'plot_bgcolor': '#01386a',
-                                        'paper_bgcolor': '#01386a'},
-                                         font_color="snow",
-                                         title_font_size = 23,
-                                         xaxis=dict(showgrid=False),
-                                         yaxis=dict(showgrid=False))
-        line_guests_month.update_traces(line_color='#a2cffe')
-                                
-        # Barplot nr of bookings by nr of special requests per cancelled/not cancelled
-        bar_cancel_req = px.bar(df_cancel_req,
-                                x = 'Special requests',
-                                y = 'Nr of bookings',
-                                barmode='group',
-                                color = 'Cancelled (1)/Not cancelled (0)',
-                                color_discrete_map={ # replaces default color mapping by value
-                                "0": "#3c73a8", "1": "#a2cffe"
-                                },
-                                height = 400,
-                                title = f"Special requests per cancelled (1)/not cancelled (0) in {hotel_type}")
-        bar_cancel_req.update_layout({'plot_bgcolor': '#01386a',
-                                      'paper_bgcolor': '#01386a'},
-                                      font_color="snow",
-                                      title_font_size = 23,
-                                      xaxis=dict(showgrid=False),
-                                      yaxis=dict(showgrid=False))
-        
-        # Barplot nr of bookings by nr of special requests per room type
-        bar_room_req = px.bar(df_room_req,
-                              x = 'Special requests',
-                              y = 'Nr of bookings',
-                              color = 'Room type',
-                              height = 400,
-                              title = f"Special requests per room type in {hotel_type}")
-        bar_room_req.update_layout({'plot_bgcolor': '#01386a',
-                                    'paper_bgcolor': '#01386a'},
-                                    font_color="snow",
-                                    title_font_size = 23,
-                                    xaxis=dict(showgrid=False),
-                                    yaxis=dict(showgrid=False))
-        
-        # Barplot preferred meals type per room type per hotel type
-        bar_meal_room = px.bar(df_meal_room,
-                               x = 'Meal',
-                               y = 'Nr of preferences',
-                               color = 'Room type',
-                               height = 400,
-                               title = f'Preferred meal type per room type in {hotel_type}')
-        bar_meal_room.update_layout({'plot_bgcolor': '#01386a',
-                                     'paper_bgcolor': '#01386a'},
-                                     font_color="snow",
-                                     title_font_size = 23,
-                                     xaxis=dict(showgrid=False),
-                                     yaxis=dict(showgrid=False))
-        
-        # Origin countries  of bookings
-        map_origin = px.choropleth(df_map,
-                                   locations = df_map['Country'],
-                                   color = df_map['Guests'],
-                                   hover_name = df_map['Country'],
-                                   title = f"Origin countries of hotel guests in {hotel_type}")
-        map_origin.update_layout({'plot_bgcolor': '#01386a',
-                                  'paper_bgcolor': '#01386a'},
-                                  font_color="snow",
-                                  title_font_size = 23,
-                                  xaxis=dict(showgrid=False),
-                                  yaxis=dict(showgrid=False))
-        
-        return[dcc.Graph(figure = line_guests_month), 
-               dcc.Graph(figure = bar_cancel_req), 
-               dcc.Graph(figure = bar_room_req), 
-               dcc.Graph(figure = bar_meal_room), 
-               dcc.Graph(figure = map_origin)]
+# Build the figures of a report tab from the precomputed data
+def build_figure(chart, position, hotel_type, start_date=None, end_date=None, drill=None):
+
+    # Plotly is only needed on a figure cache miss, not to start a worker
+    import figures
+
+    # Name of the selected hotel type(s) for the chart title, with the drill-down labels
+    # filtering the chart
+    hotel_label = ' & '.join(hotel_selection(hotel_type)) or None
+    filters = drill_filters(chart, position, drill)
+    if filters:
+        hotel_label = f"{hotel_label} ({', '.join(str(label) for _, label in filters)})"
+
+    # Look up the precomputed information for creating graph from the data
+    df = aggregate_store.get(chart, hotel_type, start_date, end_date, position, drill)
+    return figures.report_figure(chart, position, df, hotel_label)
+
+# Serve one figure from the shared cache, build and cache it on a miss
+def get_graph(chart, position, hotel_type, start_date, end_date, drill=None):
+    with metrics.stage('callback.get_graph'):
+        version = refresh_data()
+
+        key = (chart, position, hotel_selection(hotel_type), start_date, end_date,
+               drill_filters(chart, position, drill))
+        with metrics.stage('cache.get') as sizes:
+            payload = figure_cache.get(key, version)
+            sizes['bytes'] = 0 if payload is None else len(payload)
+        if payload is not None:
+            figure = json.loads(payload)
+        else:
+            with metrics.stage(f'figure.{chart}.{position + 1}'):
+                figure = build_figure(chart, position, hotel_type, start_date, end_date, drill).to_plotly_json()
+            with metrics.stage('serialize') as sizes:
+                payload = json.dumps(figure, separators=(',', ':'))
+                sizes['bytes'] = len(payload)
+            with metrics.stage('cache.set'):
+                figure_cache.set(key, version, payload)
+
+        # Return dcc.Graph component to the empty division, its id tells the drill-down
+        # which chart was clicked
+        return dcc.Graph(id={'type': 'graph', 'chart': chart, 'position': position}, figure = figure)
+
+
+def graph_callback(position):
+    # Callback of the division plot<position + 1>
+    def update_graph(chart, hotel_type, start_date, end_date, drill):
+        return get_graph(chart, position, hotel_type, start_date, end_date, drill)
+    update_graph.__name__ = f'update_plot{position + 1}'
+    return update_graph
+
+
+# Charts that drill down on click: (tab, position) and the drill-down level of their x
+# axis or slices
+DRILLS = {('OPT1', 1): 'arrival_date_month',
+          ('OPT1', 3): 'market_segment',
+          ('OPT2', 0): 'arrival_date_month'}
+
+# Select the clicked month or market segment, clicking it again clears the selection
+def drill_down(click_data, drill):
+    # New graphs come without a click, they are part of the inputs as well
+    chart_id = callback_context.triggered_id
+    click = callback_context.triggered[0]['value']
+    if not chart_id or not click:
+        return no_update
+    level = DRILLS.get((chart_id['chart'], chart_id['position']))
+    if level is None:
+        return no_update
+
+    # Month on the line x axis, segment as pie label; the capped "Other" slice holds
+    # several segments and is not a drill-down label
+    from figures import OTHER
+    point = click['points'][0]
+    label = point.get('label', point.get('x'))
+    if label is None or label == OTHER:
+        return no_update
+
+    drill = dict(drill or {})
+    if drill.get(level) == label:
+        del drill[level]
+    else:
+        drill[level] = label
+    return drill
+
+
+# Callback function definition, also registered on the notebook app. Every division has
+# its own callback: the browser sends one request per chart, the server computes them
+# in parallel (gunicorn workers/threads) and each chart renders as soon as it is ready.
+# A click on a drill-down chart updates input-drill, which re-filters the charts
+def register_callbacks(dash_app):
+    for position in range(5):
+        dash_app.callback(Output(component_id=f'plot{position + 1}', component_property='children'),
+                          [Input(component_id='input-type', component_property='value'),
+                           Input(component_id='input-hotel', component_property='value'),
+                           Input(component_id='input-dates', component_property='start_date'),
+                           Input(component_id='input-dates', component_property='end_date'),
+                           Input(component_id='input-drill', component_property='data')]
+                          )(graph_callback(position))
+
+    # A rendered graph is not a click, it must not send a request of its own
+    dash_app.callback(Output(component_id='input-drill', component_property='data'),
+                      [Input(component_id={'type': 'graph', 'chart': ALL, 'position': ALL},
+                             component_property='clickData')],
+                      [State(component_id='input-drill', component_property='data')],
+                      prevent_initial_call=True)(drill_down)
+
+register_callbacks(app)
+
+
+# Time every callback request, and sample the slow ones when the profiler is on
+@server.before_request
+def start_request_timer():
+    if request.path == '/_dash-update-component':
+        g.request_start = time.perf_counter()
+        if PROFILE_SLOW_MS:
+            g.profiler = SamplingProfiler(threading.get_ident()).start()
+
+
+@server.after_request
+def record_request(response):
+    if 'request_start' in g:
+        ms = (time.perf_counter() - g.request_start) * 1000
+        metrics.record('request', ms, bytes=response.calculate_content_length() or 0)
+        if 'profiler' in g and ms >= PROFILE_SLOW_MS:
+            g.profiler.stop()
+            name = f'{time.strftime("%Y%m%d-%H%M%S")}-{os.getpid()}-{ms:.0f}ms.folded'
+            g.profiler.dump(os.path.join(PROFILE_DIR, name))
+    return response
+
+
+@server.teardown_request
+def stop_profiler(error=None):
+    # Also stops the sampling when the request failed before a response was made
+    if 'profiler' in g:
+        g.profiler.stop()
+
+
+# Request from this machine, the metrics and the booking endpoint are not public
+def is_local_request():
+    return request.remote_addr in ('127.0.0.1', '::1')
+
+
+# Expose the latency percentiles, input and payload sizes of every stage of this worker
+@server.route('/metrics')
+def get_metrics():
+    if not is_local_request():
+        return jsonify({'error': 'metrics are only served locally'}), 403
+    return jsonify({'pid': os.getpid(), 'dataset_version': dataset_version,
+                    'profile_slow_ms': PROFILE_SLOW_MS or None,
+                    'stages': metrics.snapshot(), 'figure_cache': figure_cache.stats()})
+
+
+# Append a batch of new bookings and cancellation changes, local clients only
+@server.route('/api/bookings', methods=['POST'])
+def post_bookings():
+    if not is_local_request():
+        return jsonify({'error': 'bookings can only be posted locally'}), 403
+
+    batch = request.get_json(silent=True)
+    if not isinstance(batch, dict):
+        return jsonify({'error': 'expected a JSON object with bookings and status'}), 400
+
+    # Switch to the log of the current csv first, the booking ids count its rows
+    refresh_data()
+    try:
+        sequence, booking_ids = booking_log.append(batch.get('bookings', []), batch.get('status', []))
+    except ValueError as error:
+        return jsonify({'error': str(error)}), 400
+
+    # Every worker folds the batch in before serving its next figures
+    refresh_data()
+    return jsonify({'batch': sequence, 'booking_ids': booking_ids})
 
 
 # Run the app
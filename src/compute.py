@@ -0,0 +1,32 @@
+# Import required libraries
+from engine import BookingAggregates
+from metrics import metrics
+
+"""Compute graph data for creating hotel bookings report
+
+Function that takes hotel data as input and create dataframes based on the grouping condition
+to be used for plottling charts and graphs. The grouping is done by the fused aggregation
+engine in a single pass over the selected rows.
+
+Argument:
+
+    df_hotel: Hotel dataframe
+    rows: Positions of the selected rows (from the filter index), None selects every row
+
+Returns:
+   Dataframes to create graph.
+"""
+
+def compute_data_choice_1(df_hotel, rows=None):
+
+    # Mean monthly price, monthly bookings, nights of stay, market segments and
+    # reservations / cancellations
+    with metrics.stage('compute_data_choice_1', rows=len(df_hotel) if rows is None else len(rows)):
+        return BookingAggregates.from_frame(df_hotel, rows, charts=('OPT1',)).report('OPT1')
+
+def compute_data_choice_2(df_hotel, rows=None):
+
+    # Monthly guests, special requests per cancellation and per room type, preferred
+    # meal types per room type and origin countries
+    with metrics.stage('compute_data_choice_2', rows=len(df_hotel) if rows is None else len(rows)):
+        return BookingAggregates.from_frame(df_hotel, rows, charts=('OPT2',)).report('OPT2')
@@ -0,0 +1,301 @@
+# Import required libraries
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from filter_index import MONTHS
+
+"""Typed loader of the cleaned hotel bookings data
+
+Only the columns used by the report are read, with categoricals for the labels and
+small integers for the counts. The first load converts the csv into a bundle of .npy
+files (one per column, categoricals stored as codes) next to it; later loads memory-map
+the bundle instead of parsing the csv again.
+
+Histories larger than the memory of a worker are not loaded at all: read_chunks() reads
+the source (csv or Parquet) a bounded number of rows at a time, and the aggregate store
+folds every chunk into its tables (HOTEL_DATA_MODE=stream).
+
+The memory-mapped files are read-only and every column keeps its own block, so the
+dataframe never copies them: processes loading the same bundle share its pages through
+the page cache. Under gunicorn the master prepares the bundle once (see gunicorn.conf.py)
+and each worker only maps it.
+"""
+
+DATA_PATH = os.environ.get('HOTEL_DATA_PATH', "hotel_bookings_cleaned.csv")
+
+# 'memory' loads the bookings into a dataframe, 'stream' only reads them in chunks
+DATA_MODE = os.environ.get('HOTEL_DATA_MODE', 'memory')
+CHUNK_ROWS = int(os.environ.get('HOTEL_CHUNK_ROWS', 500_000))
+
+# Columns used by the report and their dtypes
+SCHEMA = {'hotel': 'category',
+          'is_canceled': 'int8',
+          'arrival_date_year': 'int16',
+          'arrival_date_month': 'category',
+          'arrival_date_week_number': 'int8',
+          'arrival_date_day_of_month': 'int8',
+          'stays_in_weekend_nights': 'int16',
+          'stays_in_week_nights': 'int16',
+          'adults': 'int16',
+          'children': 'int16',
+          'babies': 'int16',
+          'meal': 'category',
+          'country': 'category',
+          'market_segment': 'category',
+          'reserved_room_type': 'category',
+          'adr': 'float64',
+          'total_of_special_requests': 'int8'}
+
+# Bump when the bundle layout changes so old bundles are rebuilt
+BUNDLE_FORMAT = 2
+
+
+def file_version(path):
+    """Version of a data file, changes whenever the file is rewritten.
+
+    Argument:
+
+        path: Path of the data file
+
+    Returns:
+       Short hex string built from the file size and modification time.
+    """
+    stat = os.stat(path)
+    return hashlib.sha1(f'{stat.st_size}-{stat.st_mtime_ns}'.encode()).hexdigest()[:12]
+
+
+def bundle_path(path):
+    # The bundle lives next to the csv unless a cache directory is configured
+    cache_dir = os.environ.get('HOTEL_DATA_CACHE_DIR', os.path.dirname(os.path.abspath(path)))
+    return os.path.join(cache_dir, os.path.splitext(os.path.basename(path))[0] + '.columns')
+
+
+def read_csv(path=DATA_PATH):
+    """Parse the report columns of the csv with the dtypes of SCHEMA.
+
+    Argument:
+
+        path: Path of the csv file
+
+    Returns:
+       Dataframe with the SCHEMA columns.
+    """
+    return _with_schema(pd.read_csv(path, usecols=list(SCHEMA), dtype=_parse_dtypes()))
+
+
+def read_chunks(path=DATA_PATH, chunk_rows=CHUNK_ROWS):
+    """Read the report columns of a csv or Parquet file a chunk at a time.
+
+    Argument:
+
+        path: Path of the csv or .parquet file
+        chunk_rows: Maximum number of rows per chunk
+
+    Returns:
+       Iterator of dataframes with the SCHEMA columns, in file order. Only one chunk
+       is held in memory at a time.
+    """
+    if path.endswith('.parquet'):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError('reading Parquet files needs the pyarrow package') from None
+
+        parquet_file = pq.ParquetFile(path)
+        for batch in parquet_file.iter_batches(batch_size=chunk_rows, columns=list(SCHEMA)):
+            df = batch.to_pandas()
+            yield _with_schema(df.astype({column: dtype for column, dtype in _parse_dtypes().items()
+                                          if dtype == 'category'}))
+        return
+
+    with pd.read_csv(path, usecols=list(SCHEMA), dtype=_parse_dtypes(), chunksize=chunk_rows) as reader:
+        for df in reader:
+            yield _with_schema(df)
+
+
+def _parse_dtypes():
+    # Integer columns are parsed as numbers first, a float formatted count ('1.0')
+    # or a missing value would make the csv parser fail on a small integer dtype
+    return {column: dtype for column, dtype in SCHEMA.items() if not dtype.startswith('int')}
+
+
+def _with_schema(df):
+    # Small integer dtypes for the integer columns without missing values
+    for column, dtype in SCHEMA.items():
+        if dtype.startswith('int') and df[column].notna().all():
+            df[column] = df[column].astype(dtype)
+    return df[list(SCHEMA)]
+
+
+def bookings_frame(records):
+    """Dataframe of new booking records with the SCHEMA columns.
+
+    Argument:
+
+        records: List of dictionaries, one per booking, holding every SCHEMA column
+
+    Returns:
+       Dataframe with plain labels and the SCHEMA number dtypes. Raises ValueError
+       when a record is not a dictionary, misses a column, holds a value of the wrong
+       type or a cancellation flag or arrival date the report cannot place.
+    """
+    records = list(records)
+    for record in records:
+        if not isinstance(record, dict):
+            raise ValueError('bookings must be JSON objects')
+        missing = [column for column in SCHEMA if column not in record]
+        if missing:
+            raise ValueError(f"booking misses the columns {', '.join(missing)}")
+
+    df = pd.DataFrame.from_records(records, columns=list(SCHEMA))
+    try:
+        df = df.astype({column: object if dtype == 'category' else dtype
+                        for column, dtype in SCHEMA.items()})
+    except (TypeError, ValueError) as error:
+        raise ValueError(f'invalid booking value: {error}') from None
+
+    # The log is replayed by every worker, a value out of range would stay in the
+    # charts until the csv is replaced
+    if not df['is_canceled'].isin([0, 1]).all():
+        raise ValueError('is_canceled must be 0 or 1')
+    unknown = sorted(set(df['arrival_date_month']) - set(MONTHS), key=str)
+    if unknown:
+        raise ValueError(f"unknown arrival_date_month {', '.join(map(str, unknown))}")
+    arrival = pd.to_datetime(pd.DataFrame({'year': df['arrival_date_year'],
+                                           'month': df['arrival_date_month'].map(MONTHS.index) + 1,
+                                           'day': df['arrival_date_day_of_month']}), errors='coerce')
+    if arrival.isna().any():
+        raise ValueError('arrival_date_day_of_month is not a day of the arrival month')
+    return df
+
+
+def write_bundle(df, directory, version):
+    """Write a dataframe as a bundle of .npy files.
+
+    Argument:
+
+        df: Dataframe to write
+        directory: Bundle directory, replaced if it exists
+        version: Version of the source file, stored in the bundle metadata
+    """
+    parent = os.path.dirname(directory)
+    os.makedirs(parent, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(dir=parent, prefix='.tmp-')
+
+    try:
+        meta = {'format': BUNDLE_FORMAT, 'version': version, 'rows': len(df), 'columns': {}}
+        for column in df.columns:
+            series = df[column]
+            if isinstance(series.dtype, pd.CategoricalDtype):
+                values = series.cat.codes.to_numpy()
+                meta['columns'][column] = {'categories': series.cat.categories.tolist()}
+            else:
+                values = series.to_numpy()
+                meta['columns'][column] = {}
+            np.save(os.path.join(tmp_dir, f'{column}.npy'), values, allow_pickle=False)
+
+        with open(os.path.join(tmp_dir, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+
+        # Swap the finished bundle in, readers never see a partial one
+        if os.path.exists(directory):
+            shutil.rmtree(directory)
+        os.replace(tmp_dir, directory)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+
+def read_bundle(directory, version=None):
+    """Memory-map a bundle of .npy files as a dataframe.
+
+    Argument:
+
+        directory: Bundle directory
+        version: Expected version of the source file, None accepts any version
+
+    Returns:
+       Dataframe backed by the memory-mapped files, or None if there is no bundle of
+       the expected version.
+    """
+    try:
+        with open(os.path.join(directory, 'meta.json')) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get('format') != BUNDLE_FORMAT or (version is not None and meta['version'] != version):
+        return None
+
+    columns = {}
+    for column, info in meta['columns'].items():
+        values = np.load(os.path.join(directory, f'{column}.npy'), mmap_mode='r')
+        if 'categories' in info:
+            values = pd.Categorical.from_codes(values, categories=info['categories'])
+        columns[column] = values
+
+    return columns_frame(columns)
+
+
+def columns_frame(columns):
+    """Dataframe over existing column arrays, without copying them.
+
+    Argument:
+
+        columns: Dictionary of column name and array (or Series)
+
+    Returns:
+       Dataframe sharing the memory of the arrays.
+    """
+    # copy=False keeps one block per column, backed by the arrays
+    return pd.DataFrame(columns, copy=False)
+
+
+def prepare_bundle(path=DATA_PATH):
+    """Make sure the .npy bundle of the csv exists and is up to date.
+
+    Argument:
+
+        path: Path of the csv file
+
+    Returns:
+       Bundle directory.
+    """
+    version = file_version(path)
+    directory = bundle_path(path)
+    if read_bundle(directory, version) is None:
+        write_bundle(read_csv(path), directory, version)
+    return directory
+
+
+def load_bookings(path=DATA_PATH):
+    """Load the report columns of the bookings, through the .npy bundle when possible.
+
+    Argument:
+
+        path: Path of the csv file
+
+    Returns:
+       Dataframe with the SCHEMA columns.
+    """
+    version = file_version(path)
+    directory = bundle_path(path)
+
+    df = read_bundle(directory, version)
+    if df is not None:
+        return df
+
+    df = read_csv(path)
+    try:
+        write_bundle(df, directory, version)
+    except OSError:
+        # Read-only deployments keep working from the parsed csv
+        return df
+
+    bundled = read_bundle(directory, version)
+    return df if bundled is None else bundled
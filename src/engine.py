@@ -0,0 +1,430 @@
+# Import required libraries
+import numpy as np
+import pandas as pd
+
+from filter_index import MONTHS
+
+"""Fused aggregation engine of the hotel bookings report
+
+Every chart of the report is a count or a sum over a few label columns. The engine codes
+each column as integers once, then computes every table in a single pass over the
+selected rows with np.bincount on the combined codes, without building intermediate
+dataframes. Tables keep the hotel type as their first key and only hold counts and
+sums, so the aggregates of separate row sets can be merged by adding them up; the
+report dataframes are derived from the tables at the end.
+
+The cross-filter drill-down is answered from cubes: tables keyed by the drill-down
+levels (arrival month, market segment) and the keys of the charts, computed and merged
+like the other tables. A drill-down only slices the cubes and sums out the levels a
+chart does not show, whatever the number of bookings. Bookings missing a key of a cube
+are left out of it (every cell of a table has a label for each key).
+"""
+
+# Tables of the report: key columns (after the hotel type) and the tab using them,
+# 'DRILL' marks the cubes of the drill-down
+TABLES = {'month': (('arrival_date_month',), ('OPT1', 'OPT2')),
+          'nights': (('total_nights',), ('OPT1',)),
+          'segment': (('market_segment',), ('OPT1',)),
+          'canceled': (('is_canceled',), ('OPT1',)),
+          'requests_canceled': (('total_of_special_requests', 'is_canceled'), ('OPT2',)),
+          'requests_room': (('total_of_special_requests', 'reserved_room_type'), ('OPT2',)),
+          'meal_room': (('meal', 'reserved_room_type'), ('OPT2',)),
+          'country': (('country',), ('OPT2',)),
+          'cube': (('arrival_date_month', 'market_segment', 'is_canceled', 'meal', 'reserved_room_type',
+                    'total_of_special_requests'), ('DRILL',)),
+          'cube_nights': (('arrival_date_month', 'market_segment', 'total_nights'), ('DRILL',)),
+          'cube_country': (('arrival_date_month', 'market_segment', 'country'), ('DRILL',))}
+
+# Tables counting the not cancelled bookings only
+NC_TABLES = ('nights', 'segment', 'meal_room', 'country', 'cube_nights', 'cube_country')
+
+# Drill-down levels, the keys shared by every cube
+DRILL_LEVELS = ('arrival_date_month', 'market_segment')
+
+# Cube every report table is sliced from. The tables counting the not cancelled
+# bookings only sum the nc_bookings of the main cube, or have their own cube
+CUBES = {'month': 'cube', 'nights': 'cube_nights', 'segment': 'cube', 'canceled': 'cube',
+         'requests_canceled': 'cube', 'requests_room': 'cube', 'meal_room': 'cube',
+         'country': 'cube_country'}
+
+# Measures holding counts, every other measure is a float sum
+COUNT_MEASURES = ('count', 'nc_bookings', 'adr_count')
+
+
+def _codes(values):
+    """Integer codes and labels of a column, -1 marks a missing value.
+
+    Argument:
+
+        values: Series or array of a column
+
+    Returns:
+       Tuple of (codes, labels) arrays.
+    """
+    if isinstance(getattr(values, 'dtype', None), pd.CategoricalDtype):
+        return values.cat.codes.to_numpy(), np.asarray(values.cat.categories, dtype=object)
+
+    values = np.asarray(values)
+    if values.dtype.kind in 'iu':
+        # Small integer columns (counts, flags) are coded by offsetting their minimum
+        if len(values) == 0:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.int64)
+        low, high = int(values.min()), int(values.max())
+        return values.astype(np.intp) - low, np.arange(low, high + 1)
+
+    codes, labels = pd.factorize(values, sort=True)
+    return codes.astype(np.intp), np.asarray(labels)
+
+
+def _with_missing_slot(codes, labels):
+    # Move the missing values (-1) to an extra code after the last label, so combined
+    # codes never need a mask
+    codes = codes.astype(np.intp)
+    codes[codes < 0] = len(labels)
+    return codes
+
+
+def _reduce(keys, weights=None):
+    """Grouped counts and weighted sums over integer coded keys.
+
+    Argument:
+
+        keys: List of (name, codes, labels), the hotel type first. Codes run from 0 to
+              len(labels), the last code marks a missing value
+        weights: Dictionary of measure name and per row weights
+
+    Returns:
+       Dataframe indexed by the key labels, one row per observed combination, with a
+       'count' column and one column per weighted measure.
+    """
+    names = [name for name, _, _ in keys]
+    shape = tuple(len(labels) + 1 for _, _, labels in keys)
+    size = int(np.prod(shape))
+
+    # Combined code of every row
+    flat = keys[0][1]
+    for (_, codes, _), length in zip(keys[1:], shape[1:]):
+        flat = flat * length + codes
+
+    # Drop the missing value slot of every key
+    observed = tuple(slice(0, length - 1) for length in shape)
+    measures = {'count': np.bincount(flat, minlength=size).reshape(shape)[observed].ravel()}
+    for name, values in (weights or {}).items():
+        sums = np.bincount(flat, weights=values, minlength=size)
+        measures[name] = sums.reshape(shape)[observed].ravel()
+
+    # Keep the cells with rows only, as labels
+    cells = np.flatnonzero(measures['count'])
+    positions = np.unravel_index(cells, tuple(length - 1 for length in shape))
+    index = pd.MultiIndex.from_arrays([labels[position] for (_, _, labels), position
+                                       in zip(keys, positions)], names=names)
+    table = pd.DataFrame({name: values[cells] for name, values in measures.items()}, index=index)
+    return _typed(table)
+
+
+def _typed(table):
+    # Counts are integers, sums stay floats
+    return table.astype({name: np.int64 for name in table.columns if name in COUNT_MEASURES})
+
+
+def _numbers(values):
+    # Numeric column as float64 for the weighted sums, missing values count as 0
+    values = np.asarray(values, dtype=np.float64)
+    missing = np.isnan(values)
+    if missing.any():
+        values = np.where(missing, 0.0, values)
+    return values
+
+
+class BookingAggregates:
+    """Mergeable count/sum tables of the bookings, keyed by hotel type.
+
+    Argument:
+
+        tables: Dictionary of table name and dataframe, see TABLES
+
+    Build the tables with from_frame(), combine the tables of separate row sets with
+    merge() and derive the report dataframes with report().
+    """
+
+    def __init__(self, tables):
+        self.tables = tables
+
+    @classmethod
+    def from_frame(cls, df_hotel, rows=None, charts=('OPT1', 'OPT2', 'DRILL'), tables=None):
+        """Aggregate the bookings of a dataframe in a single pass.
+
+        Argument:
+
+            df_hotel: Hotel dataframe
+            rows: Positions of the selected rows, None selects every row
+            charts: Report tabs whose tables are computed
+            tables: Names of the tables to compute (see TABLES), None computes the
+                    tables of the charts
+
+        Returns:
+           BookingAggregates of the selected rows.
+        """
+        def column(name):
+            values = df_hotel[name]
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                codes, labels = _codes(values)
+                codes = codes if rows is None else codes[rows]
+            else:
+                values = values.to_numpy()
+                codes, labels = _codes(values if rows is None else values[rows])
+            return _with_missing_slot(codes, labels), labels
+
+        def values(name):
+            values = df_hotel[name].to_numpy()
+            return values if rows is None else values[rows]
+
+        wanted = table_names(charts, tables)
+
+        # Code every key column once, all tables reuse the codes
+        coded = {'hotel': column('hotel'), 'is_canceled': column('is_canceled')}
+        is_canceled = values('is_canceled')
+        nc = (is_canceled == 0).astype(np.float64)
+        for name in ('arrival_date_month', 'market_segment', 'total_of_special_requests',
+                     'reserved_room_type', 'meal', 'country'):
+            if any(name in TABLES[table][0] for table in wanted):
+                coded[name] = column(name)
+        if any('total_nights' in TABLES[table][0] for table in wanted):
+            total_nights = values('stays_in_weekend_nights') + values('stays_in_week_nights')
+            codes, labels = _codes(total_nights)
+            coded['total_nights'] = _with_missing_slot(codes, labels), labels
+
+        weights = {}
+        if wanted & {'month', 'cube'}:
+            adr = values('adr').astype(np.float64)
+            has_adr = nc * ~np.isnan(adr)
+            guests = (_numbers(values('adults')) + _numbers(values('children'))
+                      + _numbers(values('babies')))
+            weights['month'] = weights['cube'] = {'nc_bookings': nc,
+                                                  'adr_sum': _numbers(adr) * has_adr,
+                                                  'adr_count': has_adr,
+                                                  'guests': guests * nc}
+
+        # Tables counting the not cancelled bookings only leave the other rows out
+        # through the missing hotel code
+        hotel_codes, hotel_labels = coded['hotel']
+        nc_hotel_codes = np.where(nc > 0, hotel_codes, len(hotel_labels))
+
+        tables = {}
+        for name in wanted:
+            codes = nc_hotel_codes if name in NC_TABLES else hotel_codes
+            keys = [('hotel', codes, hotel_labels)]
+            keys += [(key,) + coded[key] for key in TABLES[name][0]]
+            tables[name] = _reduce(keys, weights.get(name))
+        return cls(tables)
+
+    def merge(self, other):
+        """Add up the tables of two sets of bookings."""
+        tables = {}
+        for name in self.tables.keys() | other.tables.keys():
+            if name not in other.tables:
+                tables[name] = self.tables[name]
+            elif name not in self.tables:
+                tables[name] = other.tables[name]
+            else:
+                table = self.tables[name].add(other.tables[name], fill_value=0)
+                # Bookings moved between cells (a cancellation) can leave empty cells
+                tables[name] = _typed(table[table['count'] != 0])
+        return BookingAggregates(tables)
+
+    def negate(self):
+        """Tables with every count and sum negated, merging them removes the bookings."""
+        return BookingAggregates({name: -table for name, table in self.tables.items()})
+
+    @property
+    def hotel_types(self):
+        return sorted({hotel for table in self.tables.values()
+                       for hotel in table.index.get_level_values(0)})
+
+    def _table(self, name, hotel_types):
+        # Rows of the selected hotel types summed over the hotel type
+        table = self.tables[name]
+        if hotel_types is not None:
+            table = table[table.index.get_level_values(0).isin(list(hotel_types))]
+        levels = list(range(1, table.index.nlevels))
+        table = table.groupby(level=levels, sort=True).sum()
+        return table[table['count'] > 0]
+
+    def drill_down(self, filters, tables=None):
+        """Report tables of the bookings with some drill-down labels, sliced from the cubes.
+
+        Argument:
+
+            filters: Tuple of (level, label) pairs, see drill_filters()
+            tables: Names of the report tables, None derives every one of them
+
+        Returns:
+           BookingAggregates holding the report tables.
+        """
+        derived = {}
+        for name in (CUBES if tables is None else tables):
+            cube = _slice(self.tables[CUBES[name]], filters)
+            # Measures of the table and the cube columns summed into them
+            if name == 'month':
+                measures = {measure: measure for measure in cube.columns}
+            elif name in NC_TABLES and CUBES[name] == 'cube':
+                measures = {'count': 'nc_bookings'}
+            else:
+                measures = {'count': 'count'}
+
+            table = cube.groupby(level=['hotel', *TABLES[name][0]], sort=True)[list(measures.values())].sum()
+            table.columns = list(measures)
+            derived[name] = _typed(table)
+        return BookingAggregates(derived)
+
+    def report(self, chart, hotel_types=None, position=None):
+        """Dataframes of a report tab.
+
+        Argument:
+
+            chart: Report tab ('OPT1' or 'OPT2')
+            hotel_types: Selected hotel types, None selects every hotel type
+            position: Position of one chart of the tab (0 to 4), None selects every chart
+
+        Returns:
+           Tuple of dataframes with the columns of the report charts, or the dataframe
+           of the chart at position.
+        """
+        if position is not None:
+            _, build = REPORTS[chart][position]
+            return build(self, hotel_types)
+        return tuple(build(self, hotel_types) for _, build in REPORTS[chart])
+
+
+def table_names(charts=('OPT1', 'OPT2', 'DRILL'), tables=None):
+    """Names of the tables computed for some report tabs, or the given tables."""
+    if tables is not None:
+        return set(tables)
+    return {name for name, (_, tabs) in TABLES.items() if set(tabs) & set(charts)}
+
+
+def drill_filters(chart, position, drill):
+    """Drill-down labels that filter a chart.
+
+    Argument:
+
+        chart: Report tab ('OPT1' or 'OPT2')
+        position: Position of the chart in the tab (0 to 4)
+        drill: Dictionary of drill-down level and selected label, None selects nothing
+
+    Returns:
+       Tuple of (level, label) pairs in DRILL_LEVELS order. A chart is not filtered on
+       the levels it shows: the monthly charts keep every month, the market segment
+       chart every segment.
+    """
+    keys = TABLES[REPORTS[chart][position][0]][0]
+    return tuple((level, (drill or {}).get(level)) for level in DRILL_LEVELS
+                 if (drill or {}).get(level) is not None and level not in keys)
+
+
+def _slice(table, filters):
+    # Rows of a table with the given label on some index levels, compared as codes
+    mask = np.ones(len(table), dtype=bool)
+    for level, label in filters:
+        i = table.index.names.index(level)
+        mask &= table.index.codes[i] == table.index.levels[i].get_indexer([label])[0]
+    return table[mask]
+
+
+def _by_month(table):
+    # Months in calendar order, labels that are not month names are left out
+    months = [month for month in MONTHS if month in table.index]
+    return table.loc[months] if months else table.iloc[:0]
+
+
+def _most_frequent(counts):
+    # Sort by count, most frequent first, within the groups of the first key like
+    # groupby().value_counts(); ties keep the label order
+    if counts.index.nlevels == 1:
+        return counts.sort_values(ascending=False, kind='mergesort')
+    first = counts.index.get_level_values(0)
+    order = np.lexsort((-counts.to_numpy(), np.asarray(first)))
+    return counts.iloc[order]
+
+
+def _frame(series, columns):
+    # Series indexed by labels as a dataframe with the report column names
+    df = series.reset_index()
+    df.columns = columns
+    return df
+
+
+# Hotel Bookings analysis
+
+def _mean_price(booking_aggregates, hotel_types):
+    # Mean monthly price of the not cancelled bookings
+    month = _by_month(booking_aggregates._table('month', hotel_types))
+    priced = month[month['nc_bookings'] > 0]
+    mean_price = priced['adr_sum'] / priced['adr_count'].where(priced['adr_count'] > 0)
+    return _frame(mean_price, ['Month', 'Monthly Price'])
+
+
+def _monthly_bookings(booking_aggregates, hotel_types):
+    # Nr of bookings per month
+    month = _by_month(booking_aggregates._table('month', hotel_types))
+    return _frame(month['count'], ['Month', 'Nr of Bookings'])
+
+
+def _stays(booking_aggregates, hotel_types):
+    # Nr bookings per nights of stay
+    return _frame(booking_aggregates._table('nights', hotel_types)['count'], ['Total nights', 'Nr of stays'])
+
+
+def _market(booking_aggregates, hotel_types):
+    # Nr of bookings per market segment, most frequent first
+    return _frame(_most_frequent(booking_aggregates._table('segment', hotel_types)['count']),
+                  ['Market segment', 'Nr of bookings'])
+
+
+def _canc_res(booking_aggregates, hotel_types):
+    # Nr reservations / cancellations
+    return _frame(booking_aggregates._table('canceled', hotel_types)['count'],
+                  ['Reservation Cancellation', 'Count'])
+
+
+# Hotel Guests analysis
+
+def _guests_month(booking_aggregates, hotel_types):
+    # Nr of guests per month of the not cancelled bookings
+    month = _by_month(booking_aggregates._table('month', hotel_types))
+    guests = month.loc[month['nc_bookings'] > 0, 'guests'].astype(np.int64)
+    return _frame(guests, ['Month', 'Total guests'])
+
+
+def _cancel_req(booking_aggregates, hotel_types):
+    # Nr of bookings per nr of special requests per cancelled/not cancelled
+    df_cancel_req = _frame(_most_frequent(booking_aggregates._table('requests_canceled', hotel_types)['count']),
+                           ['Special requests', 'Cancelled (1)/Not cancelled (0)', 'Nr of bookings'])
+    df_cancel_req['Cancelled (1)/Not cancelled (0)'] = df_cancel_req['Cancelled (1)/Not cancelled (0)'].astype(str)
+    return df_cancel_req
+
+
+def _room_req(booking_aggregates, hotel_types):
+    # Nr of bookings per nr of special requests per reserved room type
+    return _frame(_most_frequent(booking_aggregates._table('requests_room', hotel_types)['count']),
+                  ['Special requests', 'Room type', 'Nr of bookings'])
+
+
+def _meal_room(booking_aggregates, hotel_types):
+    # Preferred meal types per room types
+    return _frame(_most_frequent(booking_aggregates._table('meal_room', hotel_types)['count']),
+                  ['Meal', 'Room type', 'Nr of preferences'])
+
+
+def _map(booking_aggregates, hotel_types):
+    # Origin countries of guests
+    return _frame(_most_frequent(booking_aggregates._table('country', hotel_types)['count']),
+                  ['Country', 'Guests'])
+
+
+# Charts of every report tab in the order of the plot divisions: the table each chart
+# is derived from and the function building its dataframe
+REPORTS = {'OPT1': (('month', _mean_price), ('month', _monthly_bookings), ('nights', _stays),
+                    ('segment', _market), ('canceled', _canc_res)),
+           'OPT2': (('month', _guests_month), ('requests_canceled', _cancel_req),
+                    ('requests_room', _room_req), ('meal_room', _meal_room), ('country', _map))}
@@ -0,0 +1,179 @@
+# Import required libraries
+import fcntl
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+
+"""On-disk LRU cache of serialized figures
+
+Building the Plotly figures of a report tab costs more than looking up its data, so
+the serialized figures are cached per report selection (tab, hotel types, arrival
+dates) and dataset version. Entries are
+plain JSON files in a local directory: every gunicorn worker on the machine reads and
+writes the same directory, so a figure built by one worker is served by all of them.
+The modification time of an entry is its last use, which gives the LRU order.
+
+The total size of the entries is kept in a small file next to them, updated under a
+file lock by every writer, so storing an entry does not look at the other entries. Only
+when the total crosses the cap is the directory scanned, and the least recently used
+entries are evicted down to EVICT_TO of the cap, leaving room for the next entries.
+"""
+
+# Default cache location and memory cap, both can be set through the environment
+CACHE_DIR = os.environ.get('HOTEL_FIGURE_CACHE_DIR',
+                           os.path.join(tempfile.gettempdir(), 'hotel_figure_cache'))
+CACHE_MAX_BYTES = int(float(os.environ.get('HOTEL_FIGURE_CACHE_MB', 64)) * 1024 * 1024)
+
+# Share of the cap left in use after an eviction
+EVICT_TO = 0.9
+
+
+class FigureCache:
+    """LRU cache of serialized figures shared through a directory.
+
+    Argument:
+
+        directory: Directory holding the cache entries
+        max_bytes: Memory cap, the least recently used entries are evicted above it
+
+    Hit and miss counters are kept per process and returned by stats().
+    """
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def get(self, key, version):
+        """Return the cached figures JSON of a report selection, or None on a miss."""
+        path = self._path(key, version)
+        try:
+            with open(path) as f:
+                payload = f.read()
+            # Mark the entry as most recently used
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return payload
+
+    def set(self, key, version, payload):
+        """Store the figures JSON of a report selection and evict entries above the cap."""
+        if len(payload) > self.max_bytes:
+            return
+        # Write to a temporary file first, other workers never read a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            f.write(payload)
+        size = os.stat(tmp_path).st_size
+        path = self._path(key, version)
+
+        with self._locked():
+            # An entry of the same selection is replaced
+            total = self._total() + size
+            try:
+                total -= os.stat(path).st_size
+            except FileNotFoundError:
+                pass
+            os.replace(tmp_path, path)
+
+            if total > self.max_bytes:
+                total = self._evict(int(self.max_bytes * EVICT_TO))
+            self._write_total(total)
+
+    def discard_other_versions(self, version):
+        """Remove the entries of every dataset version other than the given one."""
+        with self._locked():
+            for entry in self._entries():
+                if not entry.name.startswith(f'{version}-'):
+                    self._remove(entry.path)
+            self._write_total(self._count_total())
+
+    def clear(self):
+        with self._locked():
+            for entry in self._entries():
+                self._remove(entry.path)
+            self._write_total(0)
+
+    def stats(self):
+        entries = self._stat_entries()
+        return {'pid': os.getpid(),
+                'hits': self.hits,
+                'misses': self.misses,
+                'entries': len(entries),
+                'bytes': sum(size for _, size, _ in entries),
+                'max_bytes': self.max_bytes}
+
+    def _path(self, key, version):
+        # The key is any JSON serializable selection, e.g. a tuple of dropdown values
+        digest = hashlib.sha1(json.dumps(key).encode()).hexdigest()
+        return os.path.join(self.directory, f'{version}-{digest}.json')
+
+    def _entries(self):
+        with os.scandir(self.directory) as it:
+            return [entry for entry in it if entry.name.endswith('.json')]
+
+    def _stat_entries(self):
+        entries = []
+        for entry in self._entries():
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        return entries
+
+    def _count_total(self):
+        return sum(size for _, size, _ in self._stat_entries())
+
+    def _total(self):
+        # Size of the entries as last written, counted once for a new cache directory
+        try:
+            with open(os.path.join(self.directory, 'size')) as f:
+                return int(f.read())
+        except (FileNotFoundError, ValueError):
+            return self._count_total()
+
+    def _write_total(self, total):
+        with open(os.path.join(self.directory, 'size'), 'w') as f:
+            f.write(str(total))
+
+    @contextmanager
+    def _locked(self):
+        # One writer of the entries and their total at a time, across processes
+        with open(os.path.join(self.directory, '.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _evict(self, target):
+        entries = self._stat_entries()
+
+        # Drop the least recently used entries until the cache fits under the target,
+        # the scan also corrects the total
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= target:
+                break
+            self._remove(path)
+            total -= size
+        return total
+
+    @staticmethod
+    def _remove(path):
+        # Another worker may have evicted the entry already
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,231 @@
+# Import required libraries
+import pandas as pd
+import plotly.graph_objects as go
+
+"""Compact figures of the hotel bookings report
+
+The figures are built with plotly.graph_objects on one shared theme, compiled once,
+instead of Plotly Express figures restyled with update_layout. A Plotly Express figure
+carries the whole default template (about 7.5 kB, nearly all of its JSON); the theme
+only holds the settings the report uses. Traces keep the data arrays and a short
+hover template: counts are sent as integers, prices rounded to cents, bar labels come
+from a text template instead of a copy of the values.
+
+Long tails are capped: the longest nights of stay and the least frequent market segments
+and room types are summed into one "Other" bar, slice or trace, and the map shows the
+countries with the most guests, the others are summed up in the title.
+"""
+
+BACKGROUND = '#01386a'
+LINE_COLOR = '#a2cffe'
+COLORWAY = ['#636efa', '#EF553B', '#00cc96', '#ab63fa', '#FFA15A', '#19d3f3', '#FF6692',
+            '#B6E880', '#FF97FF', '#FECB52']
+PLASMA = ['#0d0887', '#46039f', '#7201a8', '#9c179e', '#bd3786', '#d8576b', '#ed7953',
+          '#fb9f3a', '#fdca26', '#f0f921']
+
+# Category caps, the rest goes to an "Other" bucket
+OTHER = 'Other'
+MAX_NIGHTS = 21
+MAX_SLICES = 8
+MAX_TRACES = 8
+MAX_COUNTRIES = 60
+
+# Theme shared by every figure of the report, the settings of the default template the
+# charts rely on plus the report colors
+THEME = go.layout.Template(layout=dict(
+    paper_bgcolor=BACKGROUND,
+    plot_bgcolor=BACKGROUND,
+    font=dict(color='snow'),
+    title=dict(x=0.05, font=dict(size=23)),
+    colorway=COLORWAY,
+    margin=dict(t=60),
+    hovermode='closest',
+    xaxis=dict(showgrid=False, zeroline=False, automargin=True, ticks=''),
+    yaxis=dict(showgrid=False, zeroline=False, automargin=True, ticks=''),
+    coloraxis=dict(colorscale=PLASMA, colorbar=dict(outlinewidth=0, ticks='')),
+    geo=dict(bgcolor='white', landcolor='#E5ECF6', lakecolor='white', showlakes=True,
+             showland=True, subunitcolor='white')))
+
+
+def _ints(values):
+    return [int(value) for value in values]
+
+
+def _cents(values):
+    return [None if pd.isna(value) else round(float(value), 2) for value in values]
+
+
+def cap(df, label, value, limit):
+    """Keep the most frequent labels of a column and sum the others into "Other".
+
+    Argument:
+
+        df: Dataframe of a chart, one value column and one or more label columns
+        label: Label column to cap
+        value: Value (count) column
+        limit: Maximum number of labels, "Other" included
+
+    Returns:
+       Dataframe with at most limit labels, the "Other" rows last, the other rows in
+       their original order.
+    """
+    totals = df.groupby(label, sort=False)[value].sum()
+    if len(totals) <= limit:
+        return df
+
+    kept = totals.sort_values(ascending=False, kind='mergesort').index[:limit - 1]
+    df = df.assign(**{label: df[label].astype(object).where(df[label].isin(kept), OTHER)})
+    keys = [column for column in df.columns if column != value]
+    df = df.groupby(keys, sort=False, as_index=False)[value].sum()
+    return pd.concat([df[df[label] != OTHER], df[df[label] == OTHER]], ignore_index=True)
+
+
+def cap_above(df, label, value, bound):
+    """Keep the labels below a bound of a numeric column and sum the others into "Other".
+
+    Argument:
+
+        df: Dataframe of a chart, one value column and one label column
+        label: Numeric label column to cap
+        value: Value (count) column
+        bound: Smallest label summed into "Other"
+
+    Returns:
+       Dataframe sorted by label, the "Other" row last.
+    """
+    df = df.sort_values(label)
+    above = df[label] >= bound
+    if not above.any():
+        return df
+    other = pd.DataFrame({label: [OTHER], value: [df.loc[above, value].sum()]})
+    return pd.concat([df[~above], other], ignore_index=True)
+
+
+def _figure(data, title, **layout):
+    return go.Figure(data=data, layout=dict(template=THEME, title=dict(text=title), **layout))
+
+
+def line(df, x, y, title, values=_ints):
+    # Lineplot of a monthly value
+    trace = go.Scatter(x=df[x].tolist(), y=values(df[y]), mode='lines', line_color=LINE_COLOR,
+                       hovertemplate=f'{x}=%{{x}}<br>{y}=%{{y}}<extra></extra>')
+    return _figure([trace], title, xaxis_title=x, yaxis_title=y, showlegend=False)
+
+
+def bar(df, x, y, title, text=False, category_axis=False):
+    # Barplot of one count per label
+    trace = go.Bar(x=df[x].astype(str).tolist() if category_axis else df[x].tolist(),
+                   y=_ints(df[y]), marker_color=LINE_COLOR,
+                   texttemplate='%{y}' if text else None,
+                   hovertemplate=f'{x}=%{{x}}<br>{y}=%{{y}}<extra></extra>')
+    return _figure([trace], title, height=400, xaxis_title=x, yaxis_title=y,
+                   xaxis_type='category' if category_axis else None)
+
+
+def pie(df, names, values, title):
+    # Pie chart of the shares of the labels
+    trace = go.Pie(labels=df[names].tolist(), values=_ints(df[values]),
+                   hovertemplate=f'{names}=%{{label}}<br>{values}=%{{value}}<extra></extra>')
+    return _figure([trace], title)
+
+
+def grouped_bar(df, x, y, color, title, barmode='relative', colors=None):
+    # Barplot of the counts per label, one trace (color) per label of a second column
+    traces = []
+    for i, (name, group) in enumerate(df.groupby(color, sort=False)):
+        marker_color = colors[str(name)] if colors else COLORWAY[i % len(COLORWAY)]
+        traces.append(go.Bar(x=group[x].tolist(), y=_ints(group[y]), name=str(name),
+                             marker_color=marker_color,
+                             hovertemplate=f'{color}={name}<br>{x}=%{{x}}<br>{y}=%{{y}}<extra></extra>'))
+    return _figure(traces, title, height=400, barmode=barmode, xaxis_title=x, yaxis_title=y,
+                   legend=dict(title=dict(text=color), tracegroupgap=0))
+
+
+def choropleth(df, locations, z, title):
+    # Map of a count per country (ISO 3 code)
+    trace = go.Choropleth(locations=df[locations].tolist(), z=_ints(df[z]), coloraxis='coloraxis',
+                          hovertemplate=f'<b>%{{location}}</b><br>{z}=%{{z}}<extra></extra>')
+    return _figure([trace], title, coloraxis_colorbar_title_text=z)
+
+
+# Hotel Bookings analysis
+
+def _price_figure(df_mean_price, hotel_label):
+    return line(df_mean_price, 'Month', 'Monthly Price',
+                f"Monthly mean room-price in {hotel_label}", values=_cents)
+
+
+def _bookings_figure(df_monthly_bookings, hotel_label):
+    return line(df_monthly_bookings, 'Month', 'Nr of Bookings', f"Monthly bookings in {hotel_label}")
+
+
+def _stays_figure(df_stays, hotel_label):
+    # Nights of stay in order, the longest (rare) stays as one bar
+    df_stays = cap_above(df_stays, 'Total nights', 'Nr of stays', MAX_NIGHTS - 1)
+    return bar(df_stays, 'Total nights', 'Nr of stays',
+               f"Bookings per nights of stay in {hotel_label}", text=True, category_axis=True)
+
+
+def _market_figure(df_market, hotel_label):
+    return pie(cap(df_market, 'Market segment', 'Nr of bookings', MAX_SLICES),
+               'Market segment', 'Nr of bookings', f'Bookings per market segment in {hotel_label}')
+
+
+def _canc_res_figure(df_canc_res, hotel_label):
+    return bar(df_canc_res, 'Reservation Cancellation', 'Count',
+               f'Cancellations (1) and reservations (0) in {hotel_label}')
+
+
+# Hotel guests analysis
+
+def _guests_figure(df_guests_month, hotel_label):
+    return line(df_guests_month, 'Month', 'Total guests', f'Monthly guests in {hotel_label}')
+
+
+def _cancel_req_figure(df_cancel_req, hotel_label):
+    return grouped_bar(df_cancel_req, 'Special requests', 'Nr of bookings', 'Cancelled (1)/Not cancelled (0)',
+                       f"Special requests per cancelled (1)/not cancelled (0) in {hotel_label}",
+                       barmode='group', colors={'0': '#3c73a8', '1': LINE_COLOR})
+
+
+def _room_req_figure(df_room_req, hotel_label):
+    return grouped_bar(cap(df_room_req, 'Room type', 'Nr of bookings', MAX_TRACES),
+                       'Special requests', 'Nr of bookings', 'Room type',
+                       f"Special requests per room type in {hotel_label}")
+
+
+def _meal_room_figure(df_meal_room, hotel_label):
+    return grouped_bar(cap(df_meal_room, 'Room type', 'Nr of preferences', MAX_TRACES),
+                       'Meal', 'Nr of preferences', 'Room type',
+                       f'Preferred meal type per room type in {hotel_label}')
+
+
+def _map_figure(df_map, hotel_label):
+    # Countries with the most guests on the map, the others in the title
+    df_countries = df_map.iloc[:MAX_COUNTRIES]
+    others = df_map.iloc[MAX_COUNTRIES:]
+    map_title = f"Origin countries of hotel guests in {hotel_label}"
+    if len(others):
+        map_title += f" (+{int(others['Guests'].sum())} from {len(others)} other countries)"
+    return choropleth(df_countries, 'Country', 'Guests', map_title)
+
+
+# Figure builders of every report tab, in the order of the plot divisions
+FIGURES = {'OPT1': (_price_figure, _bookings_figure, _stays_figure, _market_figure, _canc_res_figure),
+           'OPT2': (_guests_figure, _cancel_req_figure, _room_req_figure, _meal_room_figure, _map_figure)}
+
+
+def report_figure(chart, position, df, hotel_label):
+    """Figure of one chart of a report tab.
+
+    Argument:
+
+        chart: Report tab ('OPT1' or 'OPT2')
+        position: Position of the chart in the tab (0 to 4), the plot division plot<position + 1>
+        df: Dataframe of the chart, as returned by AggregateStore.get for the position
+        hotel_label: Name of the selected hotel type(s) for the chart title
+
+    Returns:
+       Plotly figure.
+    """
+    return FIGURES[chart][position](df, hotel_label)
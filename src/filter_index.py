@@ -0,0 +1,154 @@
+# Import required libraries
+import numpy as np
+import pandas as pd
+
+"""Row index of the bookings by hotel type and arrival date
+
+The rows of every hotel type are kept as an array of positions sorted by arrival date.
+Selecting hotel types and an arrival date range then only slices those arrays
+(binary search on the dates) and merges the slices, instead of scanning whole columns
+with boolean masks.
+"""
+
+MONTHS = ['January', 'February', 'March', 'April', 'May', 'June', 'July',
+          'August', 'September', 'October', 'November', 'December']
+
+# Date of the bookings without a valid arrival date, before any date range
+_NO_DATE = np.iinfo(np.int64).min
+
+
+def arrival_dates(df_hotel):
+    """Arrival date of every booking as a day number (days since 1970-01-01).
+
+    Argument:
+
+        df_hotel: Hotel dataframe
+
+    Returns:
+       Integer array, one day number per row.
+    """
+    month = df_hotel['arrival_date_month']
+    if isinstance(month.dtype, pd.CategoricalDtype):
+        # Translate the few category labels instead of every row
+        month_numbers = np.array([MONTHS.index(m) + 1 if m in MONTHS else 0
+                                  for m in month.cat.categories] + [0])
+        month_number = month_numbers[month.cat.codes.to_numpy()]
+    else:
+        month_number = month.map({m: i + 1 for i, m in enumerate(MONTHS)}).fillna(0).to_numpy()
+
+    # Day number of the first of the month plus the day of the month, computed on
+    # plain arrays; pd.to_datetime on year/month/day columns is far slower
+    year = np.asarray(df_hotel['arrival_date_year'], dtype=np.float64)
+    day = np.asarray(df_hotel['arrival_date_day_of_month'], dtype=np.float64)
+    month_number = np.asarray(month_number, dtype=np.float64)
+    valid = ((month_number >= 1) & (year >= 1) & (year <= 9999) & (day >= 1)
+             & (year == np.floor(year)) & (day == np.floor(day)))
+
+    months = np.where(valid, (year - 1970) * 12 + month_number - 1, 0).astype(np.int64)
+    first = months.astype('datetime64[M]').astype('datetime64[D]').astype(np.int64)
+    following = (months + 1).astype('datetime64[M]').astype('datetime64[D]').astype(np.int64)
+    days = first + np.where(valid, day, 1).astype(np.int64) - 1
+
+    # Dates past the end of the month (or any missing part) have no valid arrival date
+    days[~valid | (days >= following)] = _NO_DATE
+    return days
+
+
+def day_number(date):
+    """Day number of a 'YYYY-MM-DD' date (as sent by dcc.DatePickerRange), None stays None."""
+    if date is None:
+        return None
+    return int(np.datetime64(str(date)[:10], 'D').astype(np.int64))
+
+
+class BookingIndex:
+    """Positions of the bookings per hotel type, sorted by arrival date.
+
+    Argument:
+
+        df_hotel: Hotel dataframe
+    """
+
+    def __init__(self, df_hotel):
+        dates = arrival_dates(df_hotel)
+        hotel_codes, hotel_types = pd.factorize(df_hotel['hotel'])
+
+        # Rows ordered by hotel type, then arrival date, then original position
+        order = np.lexsort((dates, hotel_codes))
+        self._positions = order
+        self._dates = dates[order]
+
+        # Slice of the ordered rows of every hotel type
+        bounds = np.searchsorted(hotel_codes[order], np.arange(len(hotel_types) + 1))
+        self._bounds = {hotel_type: (bounds[i], bounds[i + 1])
+                        for i, hotel_type in enumerate(hotel_types)}
+
+        # First and last arrival day numbers of the data
+        valid = dates[dates != _NO_DATE]
+        self.min_day = int(valid.min()) if len(valid) else None
+        self.max_day = int(valid.max()) if len(valid) else None
+
+    @property
+    def hotel_types(self):
+        return list(self._bounds)
+
+    def date_range(self):
+        """First and last arrival date of the data as 'YYYY-MM-DD' strings."""
+        return tuple(None if day is None else str(np.datetime64(day, 'D'))
+                     for day in (self.min_day, self.max_day))
+
+    def covers(self, start_date, end_date):
+        """True if the date range (day numbers, None is open) selects every date."""
+        return ((start_date is None or self.min_day is None or start_date <= self.min_day)
+                and (end_date is None or self.max_day is None or end_date >= self.max_day))
+
+    def partition(self, max_rows):
+        """Split the bookings into shards of one hotel type and an arrival date span.
+
+        Argument:
+
+            max_rows: Maximum number of bookings per shard
+
+        Returns:
+           List of (hotel_type, start, stop) slices of the ordered bookings, ordered by
+           hotel type and arrival date; positions() gives the rows of a slice.
+        """
+        shards = []
+        for hotel_type, (lo, hi) in self._bounds.items():
+            pieces = max(1, -(-(hi - lo) // max_rows))
+            edges = np.linspace(lo, hi, pieces + 1).astype(np.int64)
+            shards += [(hotel_type, int(start), int(stop))
+                       for start, stop in zip(edges[:-1], edges[1:]) if stop > start]
+        return shards
+
+    def positions(self, start, stop):
+        """Sorted row positions of a slice of the ordered bookings (see partition())."""
+        return np.sort(self._positions[start:stop])
+
+    def select(self, hotel_types, start_date=None, end_date=None):
+        """Positions of the bookings of the hotel types arriving within the date range.
+
+        Argument:
+
+            hotel_types: Selected hotel types
+            start_date: First arrival day number, None leaves the range open
+            end_date: Last arrival day number (included), None leaves the range open
+
+        Returns:
+           Sorted array of row positions, the same rows a boolean mask would select.
+        """
+        parts = []
+        for hotel_type in hotel_types:
+            if hotel_type not in self._bounds:
+                continue
+            lo, hi = self._bounds[hotel_type]
+            dates = self._dates[lo:hi]
+            start = 0 if start_date is None else np.searchsorted(dates, start_date, side='left')
+            stop = len(dates) if end_date is None else np.searchsorted(dates, end_date, side='right')
+            parts.append(self._positions[lo + start:lo + stop])
+
+        if not parts:
+            return np.empty(0, dtype=np.intp)
+
+        # Keep the rows in their original order, like a boolean mask selection
+        return np.sort(np.concatenate(parts))
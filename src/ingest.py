@@ -0,0 +1,143 @@
+# Import required libraries
+import fcntl
+import json
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+
+from dataset import DATA_MODE, DATA_PATH, bookings_frame, file_version, load_bookings, read_chunks
+
+"""Append-only log of new bookings and cancellation status changes
+
+New bookings and status changes arrive in batches, posted to the dashboard endpoint or
+appended with `python ingest.py batch.json`. Every batch is written as a numbered JSON
+file into a directory of the current csv version, so all gunicorn workers read the
+same batches in the same order and fold them into their aggregates incrementally.
+When the csv itself changes, a new directory (and log) starts.
+
+A batch holds:
+
+    bookings: List of new bookings, dictionaries with every column of dataset.SCHEMA
+    status: List of {'booking_id': id, 'is_canceled': 0 or 1} changes
+
+Booking ids are row positions: the rows of the csv first, then the new bookings in
+the order of the log.
+"""
+
+INGEST_DIR = os.environ.get('HOTEL_INGEST_DIR', 'incoming')
+
+
+class BookingLog:
+    """Numbered batch files of one csv version.
+
+    Argument:
+
+        directory: Directory of the logs
+        version: Version of the csv the booking ids refer to
+        base_rows: Number of bookings in the csv
+    """
+
+    def __init__(self, directory, version, base_rows):
+        self.directory = os.path.join(directory, version)
+        self.base_rows = base_rows
+        os.makedirs(self.directory, exist_ok=True)
+
+    def append(self, bookings, status):
+        """Validate a batch and append it to the log.
+
+        Argument:
+
+            bookings: List of new booking dictionaries
+            status: List of cancellation status changes
+
+        Returns:
+           Tuple of the batch number and the ids given to the new bookings. Raises
+           ValueError when the batch is invalid.
+        """
+        bookings = list(bookings)
+        bookings_frame(bookings)
+
+        with self._locked():
+            head = self._head()
+            first_id = self.base_rows + head['rows']
+            status = _status_changes(status, first_id + len(bookings))
+
+            batch = {'sequence': head['batches'], 'first_id': first_id,
+                     'bookings': bookings, 'status': status}
+            self._write(f"{head['batches']:08d}.json", batch)
+            self._write('head.json', {'batches': head['batches'] + 1,
+                                      'rows': head['rows'] + len(bookings)})
+
+        return batch['sequence'], list(range(first_id, first_id + len(bookings)))
+
+    def read_from(self, sequence):
+        """Batches of the log from a batch number on, in order.
+
+        Argument:
+
+            sequence: Number of the first batch to read
+
+        Returns:
+           List of batch dictionaries.
+        """
+        # The head is written after the batch, it only counts complete batches. A
+        # batch written since is read on the next call
+        batches = []
+        for number in range(sequence, self._head()['batches']):
+            with open(os.path.join(self.directory, f'{number:08d}.json')) as f:
+                batches.append(json.load(f))
+        return batches
+
+    def _head(self):
+        try:
+            with open(os.path.join(self.directory, 'head.json')) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {'batches': 0, 'rows': 0}
+
+    def _write(self, name, content):
+        # Write to a temporary file first, readers never see a partial batch
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(content, f)
+        os.replace(tmp_path, os.path.join(self.directory, name))
+
+    @contextmanager
+    def _locked(self):
+        # One writer at a time across processes, batch numbers stay gapless
+        with open(os.path.join(self.directory, '.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _status_changes(status, rows):
+    # Cancellation status changes of existing bookings as plain dictionaries
+    changes = []
+    for change in status:
+        try:
+            booking_id, is_canceled = int(change['booking_id']), int(change['is_canceled'])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError('status changes need an integer booking_id and is_canceled') from None
+        if not 0 <= booking_id < rows:
+            raise ValueError(f'unknown booking_id {booking_id}')
+        if is_canceled not in (0, 1):
+            raise ValueError('is_canceled must be 0 or 1')
+        changes.append({'booking_id': booking_id, 'is_canceled': is_canceled})
+    return changes
+
+
+# Append a batch file to the log of the current csv
+if __name__ == '__main__':
+    with open(sys.argv[1]) as f:
+        batch = json.load(f)
+    if DATA_MODE == 'stream':
+        base_rows = sum(len(chunk) for chunk in read_chunks(DATA_PATH))
+    else:
+        base_rows = len(load_bookings(DATA_PATH))
+    log = BookingLog(INGEST_DIR, file_version(DATA_PATH), base_rows)
+    sequence, booking_ids = log.append(batch.get('bookings', []), batch.get('status', []))
+    print(json.dumps({'batch': sequence, 'booking_ids': booking_ids}))
@@ -0,0 +1,158 @@
+# Import required libraries
+import collections
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+"""Latency instrumentation of the dashboard
+
+Every stage of serving a report (data refresh, filter, aggregation, figure build,
+serialization, figure cache, the whole callback request) is timed with
+metrics.stage(). A stage keeps the durations of its latest calls, from which the
+metrics endpoint reports p50/p95/p99, together with the input sizes (rows) and
+payload sizes (bytes) recorded by the stage. The numbers are per process: every
+gunicorn worker reports its own.
+
+Setting HOTEL_PROFILE_SLOW_MS turns on the sampling profiler: the stacks of every
+request are sampled every HOTEL_PROFILE_INTERVAL_MS, and the requests slower than the
+threshold are written to HOTEL_PROFILE_DIR as collapsed stacks (one 'frame;frame;frame
+count' line per stack, the input of flamegraph.pl and speedscope).
+"""
+
+# Latest durations kept per stage for the percentiles
+WINDOW = 2048
+
+# Opt-in sampling profiler of slow requests
+PROFILE_SLOW_MS = float(os.environ.get('HOTEL_PROFILE_SLOW_MS', 0))
+PROFILE_INTERVAL_MS = float(os.environ.get('HOTEL_PROFILE_INTERVAL_MS', 5))
+PROFILE_DIR = os.environ.get('HOTEL_PROFILE_DIR', 'profiles')
+
+
+class Metrics:
+    """Durations and sizes of the instrumented stages.
+
+    Argument:
+
+        window: Number of latest durations kept per stage
+    """
+
+    def __init__(self, window=WINDOW):
+        self.window = window
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name, **sizes):
+        """Time a block of code as one call of a stage.
+
+        Argument:
+
+            name: Stage name, e.g. 'aggregate' or 'figure.OPT1'
+            sizes: Sizes known up front, e.g. rows=len(df)
+
+        Yields a dictionary; sizes learned inside the block (e.g. bytes of a payload)
+        are added to it.
+        """
+        start = time.perf_counter()
+        try:
+            yield sizes
+        finally:
+            self.record(name, (time.perf_counter() - start) * 1000, **sizes)
+
+    def record(self, name, ms, **sizes):
+        """Add one call of a stage that took ms milliseconds."""
+        with self._lock:
+            stage = self._stages.get(name)
+            if stage is None:
+                stage = self._stages[name] = {'count': 0, 'total_ms': 0.0,
+                                              'ms': collections.deque(maxlen=self.window),
+                                              'sizes': {}}
+            stage['count'] += 1
+            stage['total_ms'] += ms
+            stage['ms'].append(ms)
+            for key, value in sizes.items():
+                total, last, largest = stage['sizes'].get(key, (0, 0, 0))
+                stage['sizes'][key] = (total + value, value, max(largest, value))
+
+    def snapshot(self):
+        """Percentiles and sizes of every stage.
+
+        Returns:
+           Dictionary of stage name and its count, mean/p50/p95/p99/max milliseconds
+           (over the latest calls) and the mean/last/max of every recorded size.
+        """
+        with self._lock:
+            stages = {name: (stage['count'], stage['total_ms'], np.array(stage['ms']), dict(stage['sizes']))
+                      for name, stage in self._stages.items()}
+
+        snapshot = {}
+        for name, (count, total_ms, ms, sizes) in sorted(stages.items()):
+            p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+            snapshot[name] = {'count': count,
+                              'mean_ms': round(total_ms / count, 3),
+                              'p50_ms': round(float(p50), 3),
+                              'p95_ms': round(float(p95), 3),
+                              'p99_ms': round(float(p99), 3),
+                              'max_ms': round(float(ms.max()), 3)}
+            for key, (total, last, largest) in sizes.items():
+                snapshot[name][key] = {'mean': round(total / count, 1), 'last': last, 'max': largest}
+        return snapshot
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+
+
+class SamplingProfiler:
+    """Samples the stack of one thread at a fixed interval.
+
+    Argument:
+
+        thread_id: Identifier of the sampled thread (threading.get_ident())
+        interval_ms: Milliseconds between samples
+
+    A background thread reads the current frame of the sampled thread, so the
+    sampled code runs unchanged; the cost is one stack walk per interval.
+    """
+
+    def __init__(self, thread_id, interval_ms=PROFILE_INTERVAL_MS):
+        self.thread_id = thread_id
+        self.interval = interval_ms / 1000
+        self.stacks = collections.Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})')
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def dump(self, path):
+        """Write the sampled stacks as collapsed stacks."""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f'{stack} {count}\n')
+
+
+# Metrics of this process, shared by every instrumented module
+metrics = Metrics()
@@ -0,0 +1,31 @@
+# Import required libraries
+from jupyter_dash import JupyterDash
+
+import app as dashboard
+
+"""Hotel analysis dashboard inside a Jupyter notebook
+
+The server (app.py, started by gunicorn) is a plain dash.Dash application and never
+imports the notebook stack. In a notebook, the same layout and callbacks run through
+jupyter_dash:
+
+    from notebook_app import run_notebook
+    run_notebook(mode='inline')
+"""
+
+# Notebook application sharing the layout, data and callbacks of the server
+app = JupyterDash(__name__)
+app.config.suppress_callback_exceptions = True
+app.layout = dashboard.app.layout
+dashboard.register_callbacks(app)
+
+
+def run_notebook(mode='inline', **kwargs):
+    """Show the dashboard in the notebook.
+
+    Argument:
+
+        mode: jupyter_dash display mode ('inline', 'jupyterlab' or 'external')
+        kwargs: Further arguments of JupyterDash.run_server
+    """
+    app.run_server(mode=mode, **kwargs)
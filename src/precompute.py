@@ -0,0 +1,225 @@
+# Import required libraries
+import fcntl
+import json
+import multiprocessing
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from dataset import DATA_PATH, bundle_path, file_version, prepare_bundle, read_bundle
+from engine import TABLES, BookingAggregates
+from filter_index import BookingIndex
+
+"""Parallel precomputation of the report aggregates
+
+The count/sum tables of the report are aggregated per shard of bookings, one hotel type
+and one arrival date span each, in a pool of processes. The pool is forked from the
+loading process, so the shards read the (memory-mapped) columns of the parent without
+copying them; only the small tables of every shard are sent back. They are merged in
+shard order, the result does not depend on which process finished first.
+
+The server runs the pool once per csv version, not once per worker: prepare() writes the
+tables into the column bundle, the gunicorn master calls it at start (see gunicorn.conf.py)
+and the workers load the tables with the memory-mapped bookings (load_prepared()). A
+worker that finds a new csv runs prepare() in a separate process (`python precompute.py
+--prepare`): a reload runs on a request thread, and a process running other threads is
+never forked (the child would inherit locks held by them). A file lock lets one process
+prepare a version, the others wait and load its tables. Where nothing could be prepared
+(e.g. a read-only cache directory), the worker aggregates serially itself, as it does
+where fork is not available.
+"""
+
+
+def cpu_count():
+    # CPUs this process may run on
+    return len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count() or 1
+
+# Number of pool processes preparing the tables, every CPU by default
+WORKERS = int(os.environ.get('HOTEL_PRECOMPUTE_WORKERS', 0)) or cpu_count()
+
+# Shards below this size are not worth a process of their own
+MIN_SHARD_ROWS = 50_000
+
+# Bookings of the running precompute, inherited by the forked pool processes
+_shared = None
+
+
+def aggregate(df_hotel, index, workers=WORKERS, shard_rows=None):
+    """Aggregate every booking in parallel shards.
+
+    Argument:
+
+        df_hotel: Hotel dataframe
+        index: BookingIndex of the dataframe
+        workers: Number of pool processes, 1 aggregates serially (so does a process
+                 running other threads)
+        shard_rows: Maximum number of bookings per shard, None spreads the bookings
+                    over the workers
+
+    Returns:
+       BookingAggregates of every booking, the same tables as
+       BookingAggregates.from_frame(df_hotel).
+    """
+    global _shared
+
+    if shard_rows is None:
+        shard_rows = max(-(-len(df_hotel) // max(workers, 1)), MIN_SHARD_ROWS)
+    shards = index.partition(shard_rows)
+
+    if (workers <= 1 or len(shards) <= 1 or threading.active_count() > 1
+            or 'fork' not in multiprocessing.get_all_start_methods()):
+        return BookingAggregates.from_frame(df_hotel)
+
+    _shared = (df_hotel, index)
+    try:
+        with multiprocessing.get_context('fork').Pool(min(workers, len(shards))) as pool:
+            parts = pool.map(_aggregate_shard, shards, chunksize=1)
+    finally:
+        _shared = None
+
+    # Merge in shard order, deterministic whatever the finishing order
+    booking_aggregates = parts[0]
+    for part in parts[1:]:
+        booking_aggregates = booking_aggregates.merge(part)
+    return booking_aggregates
+
+
+def _aggregate_shard(shard):
+    # Tables of the bookings of one shard, run in a pool process
+    _, start, stop = shard
+    df_hotel, index = _shared
+    return BookingAggregates.from_frame(df_hotel, index.positions(start, stop))
+
+
+def prepare(path=DATA_PATH, workers=WORKERS):
+    """Write the column bundle of a csv and the aggregates of its bookings, once per version.
+
+    Argument:
+
+        path: Path of the csv file
+        workers: Number of pool processes aggregating the bookings
+
+    Returns:
+       Bundle directory, holding the tables in aggregates.pickle. Raises OSError when
+       the cache directory is not writable.
+    """
+    directory = bundle_path(path)
+    os.makedirs(os.path.dirname(directory), exist_ok=True)
+    with _locked(directory + '.lock'):
+        version = file_version(path)
+        if _read_tables(directory, version) is None:
+            directory = prepare_bundle(path)
+            df_hotel = read_bundle(directory, version)
+            booking_aggregates = aggregate(df_hotel, BookingIndex(df_hotel), workers)
+            _write_tables(directory, version, booking_aggregates.tables)
+    return directory
+
+
+def load_prepared(path=DATA_PATH):
+    """Memory-mapped bookings of a csv and their aggregates, as written by prepare().
+
+    Argument:
+
+        path: Path of the csv file
+
+    Returns:
+       Tuple of the dataframe and its BookingAggregates, or None if the current
+       version of the csv is not prepared.
+    """
+    version = file_version(path)
+    directory = bundle_path(path)
+    tables = _read_tables(directory, version)
+    if tables is None:
+        return None
+    df_hotel = read_bundle(directory, version)
+    return None if df_hotel is None else (df_hotel, BookingAggregates(tables))
+
+
+def prepared(path=DATA_PATH):
+    """Bookings and aggregates of a csv, prepared by a separate process if needed.
+
+    Argument:
+
+        path: Path of the csv file
+
+    Returns:
+       Same as load_prepared(), None if the csv could not be prepared.
+    """
+    loaded = load_prepared(path)
+    if loaded is None:
+        # A fresh process has no other threads, it may fork the pool
+        result = subprocess.run([sys.executable, os.path.abspath(__file__), '--prepare', path],
+                                stdout=subprocess.DEVNULL)
+        if result.returncode == 0:
+            loaded = load_prepared(path)
+    return loaded
+
+
+def _read_tables(directory, version):
+    # Tables of the bundle, None if they are missing, of another version or of another
+    # table layout
+    try:
+        with open(os.path.join(directory, 'aggregates.pickle'), 'rb') as f:
+            stored = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return None
+    if stored.get('version') != version or stored.get('layout') != TABLES:
+        return None
+    return stored['tables']
+
+
+def _write_tables(directory, version, tables):
+    # Write to a temporary file first, workers never load partial tables
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        pickle.dump({'version': version, 'layout': TABLES, 'tables': tables}, f)
+    os.replace(tmp_path, os.path.join(directory, 'aggregates.pickle'))
+
+
+@contextmanager
+def _locked(path):
+    # One process prepares a csv version, the others wait for its tables
+    with open(path, 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+# Prepare the tables of a csv (--prepare), or report the wall-clock time of the parallel
+# precompute against the serial compute functions
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--prepare']:
+        print(prepare(sys.argv[2] if len(sys.argv) > 2 else DATA_PATH))
+        sys.exit()
+
+    from aggregates import AggregateStore
+    from compute import compute_data_choice_1, compute_data_choice_2
+    from dataset import load_bookings
+
+    df_hotel = load_bookings(sys.argv[1] if len(sys.argv) > 1 else DATA_PATH)
+    index = BookingIndex(df_hotel)
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else WORKERS
+
+    # Serial path: both tabs of every hotel type
+    start = time.perf_counter()
+    for hotel_type in index.hotel_types:
+        rows = index.select([hotel_type])
+        compute_data_choice_1(df_hotel, rows)
+        compute_data_choice_2(df_hotel, rows)
+    serial = time.perf_counter() - start
+
+    # Parallel path: the aggregate store of every hotel type and tab
+    start = time.perf_counter()
+    AggregateStore(df_hotel, workers=workers)
+    parallel = time.perf_counter() - start
+
+    print(json.dumps({'rows': len(df_hotel), 'workers': workers,
+                      'serial_s': round(serial, 3), 'parallel_s': round(parallel, 3),
+                      'speedup': round(serial / parallel, 2)}))
@@ -0,0 +1,35 @@
+# Import required libraries
+import os
+import sys
+
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+import dataset
+import synthetic
+
+"""Shared fixtures: a small synthetic bookings file, written once per test session"""
+
+ROWS = 20_000
+
+
+@pytest.fixture(scope='session')
+def bookings_csv(tmp_path_factory):
+    # Synthetic bookings with some missing children and countries, like the raw data
+    rng = np.random.default_rng(5)
+    df = synthetic.bookings(ROWS, rng)
+    df['children'] = df['children'].where(rng.random(ROWS) > 0.01)
+    df['country'] = df['country'].astype(object).where(rng.random(ROWS) > 0.01)
+
+    path = tmp_path_factory.mktemp('data') / 'hotel_bookings_cleaned.csv'
+    df.to_csv(path, index=False)
+    return str(path)
+
+
+@pytest.fixture(scope='session')
+def df_hotel(bookings_csv):
+    return dataset.read_csv(bookings_csv)
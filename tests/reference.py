@@ -0,0 +1,93 @@
+# Import required libraries
+import pandas as pd
+
+from filter_index import MONTHS
+
+"""Reference report of the first version of the dashboard, shared by the tests
+
+The reference functions are the pandas groupbys of the first version of the dashboard,
+run on the selected bookings as plain object columns. Rows are compared in sorted
+order: countries with the same number of guests may come in another order.
+"""
+
+HOTEL_SELECTIONS = (['City Hotel'], ['Resort Hotel'], ['City Hotel', 'Resort Hotel'])
+DATE_RANGES = ((None, None), ('2016-03-05', '2016-07-20'))
+
+
+def _by_month(df):
+    return df.set_index('Month').loc[[month for month in MONTHS if month in set(df['Month'])]].reset_index()
+
+
+def reference_choice_1(df_hotel):
+    df_hotel_nc = df_hotel[df_hotel['is_canceled'] == 0]
+
+    df_mean_price = df_hotel_nc.groupby('arrival_date_month')['adr'].mean().reset_index()
+    df_mean_price.columns = ['Month', 'Monthly Price']
+
+    df_monthly_bookings = df_hotel['arrival_date_month'].value_counts().reset_index()
+    df_monthly_bookings.columns = ['Month', 'Nr of Bookings']
+
+    total_nights = df_hotel_nc['stays_in_weekend_nights'] + df_hotel_nc['stays_in_week_nights']
+    df_stays = total_nights.value_counts().sort_index().reset_index()
+    df_stays.columns = ['Total nights', 'Nr of stays']
+
+    df_market = df_hotel_nc['market_segment'].value_counts().reset_index()
+    df_market.columns = ['Market segment', 'Nr of bookings']
+
+    df_canc_res = df_hotel['is_canceled'].value_counts().sort_index().reset_index()
+    df_canc_res.columns = ['Reservation Cancellation', 'Count']
+
+    return _by_month(df_mean_price), _by_month(df_monthly_bookings), df_stays, df_market, df_canc_res
+
+
+def reference_choice_2(df_hotel):
+    df_hotel_nc = df_hotel[df_hotel['is_canceled'] == 0]
+
+    guests = df_hotel_nc[['adults', 'children', 'babies']].sum(axis=1)
+    df_guests_month = guests.groupby(df_hotel_nc['arrival_date_month']).sum().reset_index()
+    df_guests_month.columns = ['Month', 'Total guests']
+
+    df_cancel_req = df_hotel.groupby('total_of_special_requests')['is_canceled'].value_counts().reset_index(name='n')
+    df_cancel_req.columns = ['Special requests', 'Cancelled (1)/Not cancelled (0)', 'Nr of bookings']
+    df_cancel_req['Cancelled (1)/Not cancelled (0)'] = df_cancel_req['Cancelled (1)/Not cancelled (0)'].astype(str)
+
+    df_room_req = df_hotel.groupby('total_of_special_requests')['reserved_room_type'].value_counts().reset_index(name='n')
+    df_room_req.columns = ['Special requests', 'Room type', 'Nr of bookings']
+
+    df_meal_room = df_hotel_nc.groupby('meal')['reserved_room_type'].value_counts().reset_index(name='n')
+    df_meal_room.columns = ['Meal', 'Room type', 'Nr of preferences']
+
+    df_map = df_hotel_nc['country'].value_counts().reset_index()
+    df_map.columns = ['Country', 'Guests']
+
+    return _by_month(df_guests_month), df_cancel_req, df_room_req, df_meal_room, df_map
+
+
+REFERENCES = {'OPT1': reference_choice_1, 'OPT2': reference_choice_2}
+
+
+def selected(df_hotel, hotel_types, start_date=None, end_date=None):
+    # Bookings of a selection as plain object columns, like the original csv load
+    df = df_hotel.astype({column: object for column in df_hotel.columns
+                          if isinstance(df_hotel[column].dtype, pd.CategoricalDtype)})
+    mask = df['hotel'].isin(hotel_types).to_numpy()
+    if start_date or end_date:
+        arrival = pd.to_datetime(df['arrival_date_year'].astype(str) + '-' + df['arrival_date_month']
+                                 + '-' + df['arrival_date_day_of_month'].astype(str), format='%Y-%B-%d')
+        if start_date:
+            mask &= (arrival >= start_date).to_numpy()
+        if end_date:
+            mask &= (arrival <= end_date).to_numpy()
+    return df[mask].reset_index(drop=True)
+
+
+def _normalized(df):
+    df = df.reset_index(drop=True)
+    df = df.astype({column: float if df[column].dtype.kind in 'iufb' else str for column in df.columns})
+    return df.sort_values(list(df.columns)).reset_index(drop=True)
+
+
+def assert_same_report(report, expected):
+    assert len(report) == len(expected)
+    for df, df_expected in zip(report, expected):
+        pd.testing.assert_frame_equal(_normalized(df), _normalized(df_expected), check_exact=False)
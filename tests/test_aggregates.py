@@ -0,0 +1,126 @@
+# Import required libraries
+import os
+import shutil
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import precompute
+from aggregates import AggregateStore
+from compute import compute_data_choice_1, compute_data_choice_2
+from engine import BookingAggregates, drill_filters
+from filter_index import BookingIndex
+from reference import DATE_RANGES, HOTEL_SELECTIONS, REFERENCES, assert_same_report, selected
+
+"""The aggregation engine and the aggregate store against the original report code"""
+
+
+@pytest.fixture(scope='module')
+def store(df_hotel):
+    return AggregateStore(df_hotel)
+
+
+@pytest.mark.parametrize('chart', ['OPT1', 'OPT2'])
+def test_engine_matches_reference(df_hotel, chart):
+    compute = {'OPT1': compute_data_choice_1, 'OPT2': compute_data_choice_2}[chart]
+    assert_same_report(compute(df_hotel), REFERENCES[chart](selected(df_hotel, ['City Hotel', 'Resort Hotel'])))
+
+    rows = np.flatnonzero(df_hotel['hotel'].to_numpy() == 'Resort Hotel')
+    assert_same_report(compute(df_hotel, rows), REFERENCES[chart](selected(df_hotel, ['Resort Hotel'])))
+
+
+@pytest.mark.parametrize('chart', ['OPT1', 'OPT2'])
+@pytest.mark.parametrize('hotel_types', HOTEL_SELECTIONS)
+@pytest.mark.parametrize('start_date, end_date', DATE_RANGES)
+def test_store_matches_reference(df_hotel, store, chart, hotel_types, start_date, end_date):
+    expected = REFERENCES[chart](selected(df_hotel, hotel_types, start_date, end_date))
+    assert_same_report(store.get(chart, hotel_types, start_date, end_date), expected)
+    for position, df_expected in enumerate(expected):
+        assert_same_report([store.get(chart, hotel_types, start_date, end_date, position)], [df_expected])
+
+
+def test_aggregates_merge_like_one_pass(df_hotel):
+    first = BookingAggregates.from_frame(df_hotel.iloc[:7_000].reset_index(drop=True))
+    rest = BookingAggregates.from_frame(df_hotel.iloc[7_000:].reset_index(drop=True))
+    whole = BookingAggregates.from_frame(df_hotel)
+    for chart in ('OPT1', 'OPT2'):
+        assert_same_report(first.merge(rest).report(chart), whole.report(chart))
+
+
+@pytest.mark.parametrize('chart', ['OPT1', 'OPT2'])
+@pytest.mark.parametrize('position', range(5))
+@pytest.mark.parametrize('drill', [{'arrival_date_month': 'May'}, {'market_segment': 'Groups'},
+                                   {'arrival_date_month': 'May', 'market_segment': 'Groups'}])
+@pytest.mark.parametrize('start_date, end_date', DATE_RANGES)
+def test_drill_down_matches_reference(df_hotel, store, chart, position, drill, start_date, end_date):
+    # A chart is filtered on the drill-down levels it does not show
+    df = selected(df_hotel, ['City Hotel'], start_date, end_date)
+    for level, label in drill_filters(chart, position, drill):
+        df = df[df[level] == label].reset_index(drop=True)
+
+    expected = REFERENCES[chart](df)[position]
+    assert_same_report([store.get(chart, ['City Hotel'], start_date, end_date, position, drill)], [expected])
+
+
+def test_precompute_pool_matches_serial(df_hotel):
+    index = BookingIndex(df_hotel)
+    parallel = precompute.aggregate(df_hotel, index, workers=2, shard_rows=5_000)
+    whole = BookingAggregates.from_frame(df_hotel)
+    for chart in ('OPT1', 'OPT2'):
+        assert_same_report(parallel.report(chart), whole.report(chart))
+
+
+def test_precompute_never_forks_a_threaded_process(df_hotel, monkeypatch):
+    def no_fork(method):
+        raise AssertionError('forked a process running other threads')
+    monkeypatch.setattr(precompute.multiprocessing, 'get_context', no_fork)
+
+    done = threading.Event()
+    thread = threading.Thread(target=done.wait)
+    thread.start()
+    try:
+        serial = precompute.aggregate(df_hotel, BookingIndex(df_hotel), workers=2, shard_rows=5_000)
+    finally:
+        done.set()
+        thread.join()
+    assert_same_report(serial.report('OPT1'), BookingAggregates.from_frame(df_hotel).report('OPT1'))
+
+
+def test_prepared_tables_follow_the_csv_version(bookings_csv, df_hotel, tmp_path):
+    path = str(tmp_path / 'hotel_bookings_cleaned.csv')
+    shutil.copy(bookings_csv, path)
+    assert precompute.load_prepared(path) is None
+
+    precompute.prepare(path, workers=2)
+    df_prepared, booking_aggregates = precompute.load_prepared(path)
+    pd.testing.assert_frame_equal(df_prepared, df_hotel)
+    whole = BookingAggregates.from_frame(df_hotel)
+    assert booking_aggregates.tables.keys() == whole.tables.keys()
+    for name, table in whole.tables.items():
+        pd.testing.assert_frame_equal(booking_aggregates.tables[name].sort_index(), table.sort_index())
+
+    # A rewritten csv is prepared again
+    os.utime(path, ns=(0, 0))
+    assert precompute.load_prepared(path) is None
+
+
+def test_prepared_by_a_separate_process(bookings_csv, df_hotel, tmp_path, monkeypatch):
+    # A reload on a request thread prepares the tables in a fresh process, this one
+    # is never forked
+    def no_fork(method):
+        raise AssertionError('forked a process running other threads')
+    monkeypatch.setattr(precompute.multiprocessing, 'get_context', no_fork)
+    path = str(tmp_path / 'hotel_bookings_cleaned.csv')
+    shutil.copy(bookings_csv, path)
+
+    done = threading.Event()
+    thread = threading.Thread(target=done.wait)
+    thread.start()
+    try:
+        _, booking_aggregates = precompute.prepared(path)
+    finally:
+        done.set()
+        thread.join()
+    assert_same_report(booking_aggregates.report('OPT2'), BookingAggregates.from_frame(df_hotel).report('OPT2'))
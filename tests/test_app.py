@@ -0,0 +1,124 @@
+# Import required libraries
+import functools
+import importlib
+import json
+import os
+import shutil
+import sys
+
+import pytest
+
+import dataset
+import figure_cache
+import ingest
+from figures import OTHER
+from ingest import BookingLog
+
+"""The dashboard module: data versions, the booking endpoint and the drill-down
+
+The module loads its data at import. Every test imports a fresh copy over its own csv,
+booking log and figure cache directory.
+"""
+
+
+@pytest.fixture
+def dashboard(bookings_csv, tmp_path, monkeypatch):
+    csv_path = str(tmp_path / 'hotel_bookings_cleaned.csv')
+    shutil.copy(bookings_csv, csv_path)
+    monkeypatch.setattr(dataset, 'DATA_PATH', csv_path)
+    monkeypatch.setattr(ingest, 'INGEST_DIR', str(tmp_path / 'incoming'))
+    monkeypatch.setattr(figure_cache, 'FigureCache',
+                        functools.partial(figure_cache.FigureCache, str(tmp_path / 'figures')))
+
+    def load():
+        monkeypatch.delitem(sys.modules, 'app', raising=False)
+        return importlib.import_module('app')
+    return load
+
+
+def new_bookings(df_hotel, rows):
+    new = df_hotel.dropna(subset=['children']).iloc[:rows]
+    return new.astype(object).where(new.notna(), None).to_dict('records')
+
+
+def test_worker_start_keeps_the_figures_of_the_logged_version(dashboard, df_hotel):
+    version = dataset.file_version(dataset.DATA_PATH)
+    BookingLog(ingest.INGEST_DIR, version, len(df_hotel)).append(new_bookings(df_hotel, 2), [])
+    cache = figure_cache.FigureCache()
+    cache.set('served', f'{version}.1', '{}')
+    cache.set('stale', f'{version}.0', '{}')
+
+    # A (re)started worker applies the log before it drops the figures of other versions
+    app = dashboard()
+    assert app.dataset_version == f'{version}.1'
+    assert cache.get('served', f'{version}.1') == '{}'
+    assert cache.get('stale', f'{version}.0') is None
+
+
+def click(dashboard_app, chart, position, point, drill=None):
+    # Drill-down request of the browser after a click on one of the five graphs
+    graphs = [{'chart': chart, 'position': p, 'type': 'graph'} for p in range(5)]
+    clicked = json.dumps(graphs[position], sort_keys=True, separators=(',', ':'))
+    payload = {'output': 'input-drill.data',
+               'outputs': {'id': 'input-drill', 'property': 'data'},
+               'inputs': [[{'id': graph, 'property': 'clickData',
+                            'value': {'points': [point]} if graph is graphs[position] else None}
+                           for graph in graphs]],
+               'state': [{'id': 'input-drill', 'property': 'data', 'value': drill}],
+               'changedPropIds': [f'{clicked}.clickData']}
+    response = dashboard_app.server.test_client().post('/_dash-update-component', json=payload)
+    if response.status_code == 204:
+        return 'no_update'
+    assert response.status_code == 200, response.data
+    return response.get_json()['response']['input-drill']['data']
+
+
+def test_drill_down_toggles_the_clicked_label(dashboard):
+    app = dashboard()
+    drill = click(app, 'OPT1', 1, {'x': 'May', 'y': 10})
+    assert drill == {'arrival_date_month': 'May'}
+    drill = click(app, 'OPT1', 3, {'label': 'Groups', 'value': 5}, drill)
+    assert drill == {'arrival_date_month': 'May', 'market_segment': 'Groups'}
+
+    # Another month replaces the month, the same month again clears it
+    assert click(app, 'OPT2', 0, {'x': 'June', 'y': 3}, drill) == {'arrival_date_month': 'June',
+                                                                  'market_segment': 'Groups'}
+    assert click(app, 'OPT1', 1, {'x': 'May', 'y': 10}, drill) == {'market_segment': 'Groups'}
+
+
+def test_drill_down_ignores_other_slice_and_charts(dashboard):
+    app = dashboard()
+    drill = {'arrival_date_month': 'May'}
+    # The capped "Other" slice holds several market segments
+    assert click(app, 'OPT1', 3, {'label': OTHER, 'value': 5}, drill) == 'no_update'
+    # The nights and meal charts are not drill-down sources
+    assert click(app, 'OPT1', 2, {'x': '3', 'y': 10}, drill) == 'no_update'
+    assert click(app, 'OPT2', 3, {'x': 'BB', 'y': 10}, drill) == 'no_update'
+
+
+def test_rendered_graphs_send_no_drill_down_request(dashboard):
+    app = dashboard()
+    callbacks = {callback['output']: callback for callback in app.app._callback_list}
+    assert callbacks['input-drill.data']['prevent_initial_call']
+
+
+def test_post_after_the_csv_is_replaced(dashboard, df_hotel):
+    app = dashboard()
+    client = app.server.test_client()
+
+    # A new csv version, the batch goes to its log and counts its rows
+    os.utime(dataset.DATA_PATH, ns=(0, 0))
+    version = dataset.file_version(dataset.DATA_PATH)
+    response = client.post('/api/bookings', json={'bookings': new_bookings(df_hotel, 1), 'status': []})
+    assert response.get_json() == {'batch': 0, 'booking_ids': [len(df_hotel)]}
+
+    assert len(BookingLog(ingest.INGEST_DIR, version, len(df_hotel)).read_from(0)) == 1
+    assert app.dataset_version == f'{version}.1'
+    assert app.aggregate_store.get('OPT1', ['City Hotel', 'Resort Hotel'])[4]['Count'].sum() == len(df_hotel) + 1
+
+
+def test_post_rejects_invalid_bookings(dashboard, df_hotel):
+    client = dashboard().server.test_client()
+    booking = dict(new_bookings(df_hotel, 1)[0], is_canceled=7)
+    assert client.post('/api/bookings', json={'bookings': [booking]}).status_code == 400
+    assert client.post('/api/bookings', json={'bookings': [1]}).status_code == 400
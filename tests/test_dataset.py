@@ -0,0 +1,46 @@
+# Import required libraries
+import numpy as np
+import pandas as pd
+
+import dataset
+from aggregates import AggregateStore
+
+
+def test_bundle_round_trip(df_hotel, tmp_path):
+    # The cache directory is created on the first write
+    directory = str(tmp_path / 'cache' / 'bookings.columns')
+    dataset.write_bundle(df_hotel, directory, 'v1')
+
+    bundled = dataset.read_bundle(directory, 'v1')
+    pd.testing.assert_frame_equal(bundled, df_hotel)
+    assert dataset.read_bundle(directory, 'v2') is None
+
+
+def test_load_bookings_without_writable_cache(bookings_csv, df_hotel, tmp_path, monkeypatch):
+    # A cache directory that cannot be created leaves the parsed csv
+    blocker = tmp_path / 'file'
+    blocker.write_text('')
+    monkeypatch.setenv('HOTEL_DATA_CACHE_DIR', str(blocker / 'cache'))
+    pd.testing.assert_frame_equal(dataset.load_bookings(bookings_csv), df_hotel)
+
+
+def _mapped(values):
+    # True if the array is a view of a memory-mapped file
+    while values is not None:
+        if isinstance(values, np.memmap):
+            return True
+        values = getattr(values, 'base', None)
+    return False
+
+
+def test_bundle_columns_stay_mapped(df_hotel, tmp_path):
+    directory = str(tmp_path / 'bookings.columns')
+    dataset.write_bundle(df_hotel, directory, 'v1')
+    bundled = dataset.read_bundle(directory, 'v1')
+
+    store = AggregateStore(bundled)
+    store.get('OPT1', ['City Hotel'], '2016-03-05', '2016-07-20')
+    store.get('OPT2', ['City Hotel'], '2016-03-05', '2016-07-20', 4, {'arrival_date_month': 'May'})
+    for column in bundled.columns:
+        values = bundled[column]
+        assert _mapped(values.cat.codes.to_numpy() if hasattr(values, 'cat') else values.to_numpy()), column
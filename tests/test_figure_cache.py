@@ -0,0 +1,42 @@
+# Import required libraries
+import os
+
+from figure_cache import FigureCache
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = FigureCache(str(tmp_path), max_bytes=1000)
+    for i in range(3):
+        cache.set(['selection', i], 'v1', 'x' * 300)
+        # Distinct modification times, the LRU order does not depend on the clock tick
+        os.utime(cache._path(['selection', i], 'v1'), ns=(i, i))
+    assert cache.get(['selection', 0], 'v1') is not None
+
+    # Above the cap, the least recently used entry goes
+    cache.set(['selection', 3], 'v1', 'x' * 300)
+    assert cache.get(['selection', 1], 'v1') is None
+    assert cache.get(['selection', 0], 'v1') is not None
+    assert cache._total() == cache.stats()['bytes'] == 900
+
+
+def test_set_below_cap_does_not_scan(tmp_path, monkeypatch):
+    cache = FigureCache(str(tmp_path), max_bytes=10_000)
+    cache.set('first', 'v1', 'x' * 100)
+
+    def scan():
+        raise AssertionError('scanned the cache directory')
+    monkeypatch.setattr(cache, '_entries', scan)
+    for i in range(20):
+        cache.set(['selection', i], 'v1', 'x' * 100)
+    cache.set(['selection', 0], 'v1', 'x' * 50)
+    monkeypatch.undo()
+    assert cache._total() == cache.stats()['bytes'] == 2050
+
+
+def test_discard_other_versions_keeps_the_total(tmp_path):
+    cache = FigureCache(str(tmp_path), max_bytes=10_000)
+    cache.set('a', 'v1', 'x' * 100)
+    cache.set('a', 'v2', 'x' * 200)
+    cache.discard_other_versions('v2')
+    assert cache.get('a', 'v1') is None
+    assert cache._total() == cache.stats()['bytes'] == 200
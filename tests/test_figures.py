@@ -0,0 +1,46 @@
+# Import required libraries
+import pandas as pd
+
+from figures import MAX_NIGHTS, OTHER, cap, cap_above, report_figure
+
+"""Capped long tails of the report figures"""
+
+
+def test_cap_keeps_the_most_frequent_labels():
+    df = pd.DataFrame({'Market segment': ['Direct', 'Groups', 'Aviation', 'Online TA', 'Complementary'],
+                       'Nr of bookings': [30, 50, 2, 90, 1]})
+    capped = cap(df, 'Market segment', 'Nr of bookings', 3)
+    assert capped['Market segment'].tolist() == ['Groups', 'Online TA', OTHER]
+    assert capped['Nr of bookings'].tolist() == [50, 90, 33]
+
+    # Below the limit the chart is left as it is
+    assert cap(df, 'Market segment', 'Nr of bookings', 5) is df
+
+
+def test_cap_sums_other_per_group():
+    df = pd.DataFrame({'Meal': ['BB', 'BB', 'BB', 'HB', 'HB'],
+                       'Room type': ['A', 'D', 'E', 'A', 'E'],
+                       'Nr of preferences': [10, 8, 1, 4, 2]})
+    capped = cap(df, 'Room type', 'Nr of preferences', 2)
+    assert capped.values.tolist() == [['BB', 'A', 10], ['HB', 'A', 4], ['BB', OTHER, 9], ['HB', OTHER, 2]]
+
+
+def test_nights_keep_the_shortest_stays():
+    # A peak of long stays does not push shorter stays into "Other"
+    nights = list(range(30))
+    stays = [100 - night for night in nights]
+    stays[21] = 500
+    df_stays = pd.DataFrame({'Total nights': nights[::-1], 'Nr of stays': stays[::-1]})
+
+    capped = cap_above(df_stays, 'Total nights', 'Nr of stays', MAX_NIGHTS - 1)
+    assert capped['Total nights'].tolist() == list(range(MAX_NIGHTS - 1)) + [OTHER]
+    assert capped['Nr of stays'].iloc[-1] == sum(stays[MAX_NIGHTS - 1:])
+
+    figure = report_figure('OPT1', 2, df_stays, 'City Hotel')
+    assert list(figure.data[0].x) == [str(night) for night in range(MAX_NIGHTS - 1)] + [OTHER]
+
+
+def test_nights_below_the_bound_stay_as_they_are():
+    df_stays = pd.DataFrame({'Total nights': [3, 1, 2], 'Nr of stays': [5, 6, 7]})
+    capped = cap_above(df_stays, 'Total nights', 'Nr of stays', MAX_NIGHTS - 1)
+    assert capped['Total nights'].tolist() == [1, 2, 3]
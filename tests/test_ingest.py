@@ -0,0 +1,80 @@
+# Import required libraries
+import os
+
+import pandas as pd
+import pytest
+
+import dataset
+from aggregates import AggregateStore
+from ingest import BookingLog
+from reference import DATE_RANGES, HOTEL_SELECTIONS, assert_same_report
+
+"""The booking log of the ingestion API, shared by the gunicorn workers, and the
+incremental update of the aggregate store"""
+
+
+def test_read_from_follows_the_head(df_hotel, tmp_path):
+    new = df_hotel.dropna(subset=['children']).iloc[:3]
+    records = new.astype(object).where(new.notna(), None).to_dict('records')
+    writer = BookingLog(str(tmp_path), 'v1', base_rows=100)
+    reader = BookingLog(str(tmp_path), 'v1', base_rows=100)
+    assert reader.read_from(0) == []
+
+    assert writer.append(records[:2], []) == (0, [100, 101])
+    assert [batch['sequence'] for batch in reader.read_from(0)] == [0]
+
+    # A batch appended within the same directory timestamp tick is still read
+    mtime = os.stat(writer.directory).st_mtime_ns
+    assert writer.append(records[2:], [{'booking_id': 100, 'is_canceled': 1}]) == (1, [102])
+    os.utime(writer.directory, ns=(mtime, mtime))
+    batches = reader.read_from(1)
+    assert [batch['sequence'] for batch in batches] == [1]
+    assert batches[0]['status'] == [{'booking_id': 100, 'is_canceled': 1}]
+    assert reader.read_from(2) == []
+
+
+@pytest.mark.parametrize('column, value, message', [
+    ('is_canceled', 7, 'is_canceled must be 0 or 1'),
+    ('arrival_date_month', 'Smarch', 'unknown arrival_date_month Smarch'),
+    ('arrival_date_day_of_month', 31, 'not a day of the arrival month'),
+    ('arrival_date_day_of_month', 0, 'not a day of the arrival month')])
+def test_append_rejects_values_out_of_range(df_hotel, tmp_path, column, value, message):
+    new = df_hotel.dropna(subset=['children']).iloc[:2]
+    records = new.astype(object).where(new.notna(), None).to_dict('records')
+    records[1].update({'arrival_date_month': 'April', column: value})
+    log = BookingLog(str(tmp_path), 'v1', base_rows=100)
+
+    with pytest.raises(ValueError, match=message):
+        log.append(records, [])
+    assert log.read_from(0) == []
+
+
+def test_append_rejects_records_that_are_not_objects(tmp_path):
+    log = BookingLog(str(tmp_path), 'v1', base_rows=100)
+    with pytest.raises(ValueError, match='bookings must be JSON objects'):
+        log.append([1], [])
+
+
+def test_ingest_matches_rebuilt_store(df_hotel):
+    # Bookings without missing counts, the ingestion API takes integers
+    loaded = df_hotel.iloc[:15_000].reset_index(drop=True)
+    new = df_hotel.iloc[15_000:].dropna(subset=['children']).reset_index(drop=True)
+    records = new.astype(object).where(new.notna(), None).to_dict('records')
+    status = [{'booking_id': 3, 'is_canceled': 1 - int(loaded['is_canceled'][3])},
+              {'booking_id': 8, 'is_canceled': 1 - int(loaded['is_canceled'][8])},
+              {'booking_id': len(loaded) + 2, 'is_canceled': 1 - int(new['is_canceled'][2])}]
+
+    store = AggregateStore(loaded)
+    store.ingest(dataset.bookings_frame(records[:2000]), status[:2])
+    store.ingest(dataset.bookings_frame(records[2000:]), status[2:])
+
+    full = pd.concat([loaded.astype({'country': object}), new.astype({'country': object})], ignore_index=True)
+    for change in status:
+        full.loc[change['booking_id'], 'is_canceled'] = change['is_canceled']
+    rebuilt = AggregateStore(full)
+
+    for chart in ('OPT1', 'OPT2'):
+        for hotel_types in HOTEL_SELECTIONS:
+            for start_date, end_date in DATE_RANGES:
+                assert_same_report(store.get(chart, hotel_types, start_date, end_date),
+                                   rebuilt.get(chart, hotel_types, start_date, end_date))
@@ -0,0 +1,69 @@
+# Import required libraries
+import threading
+import time
+
+import numpy as np
+
+from metrics import Metrics, SamplingProfiler
+
+"""Stage percentiles and the sampling profiler"""
+
+
+def test_snapshot_percentiles_and_sizes():
+    metrics = Metrics()
+    for ms in range(1, 101):
+        metrics.record('figure', float(ms), bytes=ms * 10)
+
+    stage = metrics.snapshot()['figure']
+    assert stage['count'] == 100
+    assert stage['mean_ms'] == 50.5
+    assert (stage['p50_ms'], stage['p95_ms'], stage['p99_ms']) == tuple(
+        round(float(p), 3) for p in np.percentile(np.arange(1, 101), [50, 95, 99]))
+    assert stage['max_ms'] == 100
+    assert stage['bytes'] == {'mean': 505.0, 'last': 1000, 'max': 1000}
+
+
+def test_percentiles_cover_the_latest_calls():
+    # The window keeps the latest durations, the count and mean cover every call
+    metrics = Metrics(window=10)
+    for ms in [1000.0] * 5 + [1.0] * 10:
+        metrics.record('aggregate', ms)
+
+    stage = metrics.snapshot()['aggregate']
+    assert stage['count'] == 15
+    assert stage['p99_ms'] == stage['max_ms'] == 1
+    assert stage['mean_ms'] == round(5010 / 15, 3)
+
+
+def test_stage_times_a_block():
+    metrics = Metrics()
+    with metrics.stage('serialize', rows=3) as sizes:
+        time.sleep(0.01)
+        sizes['bytes'] = 42
+    stage = metrics.snapshot()['serialize']
+    assert stage['max_ms'] >= 10
+    assert stage['rows']['last'] == 3 and stage['bytes']['last'] == 42
+
+
+def _busy_wait(done):
+    while not done.is_set():
+        pass
+
+
+def test_profiler_samples_the_thread(tmp_path):
+    done = threading.Event()
+    thread = threading.Thread(target=_busy_wait, args=(done,))
+    thread.start()
+    try:
+        profiler = SamplingProfiler(thread.ident, interval_ms=1).start()
+        time.sleep(0.1)
+        stacks = profiler.stop()
+    finally:
+        done.set()
+        thread.join()
+
+    assert stacks and all('_busy_wait (test_metrics.py:' in stack for stack in stacks)
+    path = tmp_path / 'profiles' / 'slow.txt'
+    profiler.dump(str(path))
+    lines = path.read_text().splitlines()
+    assert sum(int(line.rsplit(' ', 1)[1]) for line in lines) == sum(stacks.values())
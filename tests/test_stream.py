@@ -0,0 +1,65 @@
+# Import required libraries
+import pytest
+
+import dataset
+
+from aggregates import AggregateStore
+from metrics import metrics
+from reference import DATE_RANGES, HOTEL_SELECTIONS, assert_same_report
+
+"""Booking histories streamed in chunks against the store built from the whole dataframe"""
+
+
+@pytest.fixture(scope='module')
+def store(df_hotel):
+    return AggregateStore(df_hotel)
+
+
+@pytest.fixture(scope='module')
+def streamed_store(bookings_csv):
+    streamed = AggregateStore()
+    streamed.stream(bookings_csv, chunk_rows=3_000)
+    return streamed
+
+
+def test_stream_matches_build(streamed_store, store):
+    assert streamed_store.date_range() == store.date_range()
+    for chart in ('OPT1', 'OPT2'):
+        for hotel_types in HOTEL_SELECTIONS:
+            for start_date, end_date in DATE_RANGES:
+                assert_same_report(streamed_store.get(chart, hotel_types, start_date, end_date),
+                                   store.get(chart, hotel_types, start_date, end_date))
+                for drill in (None, {'arrival_date_month': 'May', 'market_segment': 'Groups'}):
+                    for position in range(5):
+                        assert_same_report(
+                            [streamed_store.get(chart, hotel_types, start_date, end_date, position, drill)],
+                            [store.get(chart, hotel_types, start_date, end_date, position, drill)])
+
+
+def test_stream_reads_once_per_selection(streamed_store):
+    # The charts of both tabs and their drill-downs share one read of the file
+    reads = metrics.snapshot().get('aggregate.stream', {}).get('count', 0)
+    for chart in ('OPT1', 'OPT2'):
+        for drill in (None, {'arrival_date_month': 'June'}):
+            for position in range(5):
+                streamed_store.get(chart, ['Resort Hotel'], '2015-09-01', '2016-02-29', position, drill)
+    assert metrics.snapshot()['aggregate.stream']['count'] == reads + 1
+
+
+def test_stream_ingest_matches_build(bookings_csv, df_hotel):
+    new = df_hotel.dropna(subset=['children']).iloc[:50].reset_index(drop=True)
+    bookings = dataset.bookings_frame(new.astype(object).where(new.notna(), None).to_dict('records'))
+    # Changes in the first, a middle and the last chunk of the file, and of a new booking
+    status = [{'booking_id': booking_id, 'is_canceled': 1 - int(df_hotel['is_canceled'][booking_id])}
+              for booking_id in (0, 7_500, len(df_hotel) - 1)]
+    status.append({'booking_id': len(df_hotel) + 3, 'is_canceled': 1 - int(new['is_canceled'][3])})
+
+    streamed, built = AggregateStore(), AggregateStore(df_hotel)
+    streamed.stream(bookings_csv, chunk_rows=3_000)
+    for store in (streamed, built):
+        store.ingest(bookings, status)
+
+    for chart in ('OPT1', 'OPT2'):
+        for start_date, end_date in DATE_RANGES:
+            assert_same_report(streamed.get(chart, ['City Hotel', 'Resort Hotel'], start_date, end_date),
+                               built.get(chart, ['City Hotel', 'Resort Hotel'], start_date, end_date))